@@ -0,0 +1,422 @@
+"""
+Asyncio client of the game server.
+
+AsyncNetwork speaks the protocol of Network (every message is a 4-byte
+big-endian length followed by the JSON payload) on a non-blocking socket
+driven by the event loop:
+
+- the frames are received with recv_into in a buffer allocated once (and
+  grown only for a longer message), so a message is neither concatenated
+  packet by packet nor copied before being decoded;
+- the length and the payload of an outgoing message are packed in a second
+  buffer and written with one call;
+- a reader task decodes every state as soon as it arrives and hands it to
+  the listeners (add_listener) and to the queue read by get_state, so a
+  driver learns about the move of the opponent the instant it is received
+  instead of when it next asks for it.
+
+EchoServer sends every frame back to its sender, optionally a few bytes at
+a time, to test the framing and time the round trips without the Java
+server. game_check plays short games of random moves between two
+AsyncNetwork clients through an arena.LocalServer, to test the whole client
+against a referee:
+
+    python aionet.py echo --messages 10000 --size 1200 --chunk 7
+    python aionet.py game --games 5
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import socket
+import struct
+import time
+
+# utils
+from utils import Converter, Network
+
+HEADER = struct.Struct('>i')
+
+# The outcomes announced by the server, as returned by Network.get_state
+OUTCOMES = {'WHITEWIN': (0, "WHITE WINS!"),
+            'BLACKWIN': (1, "BLACK WINS!"),
+            'DRAW': (2, "DRAW!")}
+
+
+class FrameReader:
+    def __init__(self, sock, size=4096):
+        """
+        Args:
+            sock (socket.socket): A non-blocking socket.
+            size (int): The initial size of the receive buffer in bytes.
+        """
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+
+    async def _fill(self, n):
+        # Receives n bytes at the start of the buffer
+        loop = asyncio.get_running_loop()
+        received = 0
+        while received < n:
+            size = await loop.sock_recv_into(self.sock, self.view[received:n])
+            if not size:
+                raise ConnectionError("The server closed the connection")
+            received += size
+
+    async def read_frame(self):
+        """
+        Receives the next message.
+
+        Returns:
+            memoryview: The payload, valid until the next call.
+        """
+        await self._fill(HEADER.size)
+        length = HEADER.unpack_from(self.buffer)[0]
+        if length > len(self.buffer):
+            self.buffer = bytearray(max(length, 2 * len(self.buffer)))
+            self.view = memoryview(self.buffer)
+        await self._fill(length)
+        return self.view[:length]
+
+
+class FrameWriter:
+    def __init__(self, sock, size=1024):
+        """
+        Args:
+            sock (socket.socket): A non-blocking socket.
+            size (int): The initial size of the send buffer in bytes.
+        """
+        self.sock = sock
+        self.buffer = bytearray(size)
+
+    async def write_frame(self, data):
+        """
+        Sends data after its length, in a single write.
+        """
+        end = HEADER.size + len(data)
+        if end > len(self.buffer):
+            self.buffer = bytearray(max(end, 2 * len(self.buffer)))
+        HEADER.pack_into(self.buffer, 0, len(data))
+        self.buffer[HEADER.size:end] = data
+        with memoryview(self.buffer) as view:
+            await asyncio.get_running_loop().sock_sendall(self.sock, view[:end])
+
+
+class AsyncNetwork:
+    def __init__(self, name, player, server_ip='localhost', converter=None, timeout=60, port=None):
+        """
+        Args:
+            name (str): The name of the player, sent to the server.
+            player (str): WHITE or BLACK.
+            server_ip (str): The address of the server.
+            converter (Converter): Decodes the states, a new one by default.
+            timeout (float): The seconds the connection can take.
+            port (int): The port of the server, by default 5800 for WHITE
+                and 5801 for BLACK.
+        """
+        self.name = name
+        self.player = player
+        self.server_ip = server_ip
+        self.converter = converter or Converter()
+        self.timeout = timeout
+        self.port = port
+        self.sock = None
+        self.turn = self.state = None
+        self.listeners = []
+        self.states = self.reader_task = None
+
+    def add_listener(self, callback):
+        """
+        Calls callback(state, turn) from the event loop on every state
+        received, before get_state returns it.
+        """
+        self.listeners.append(callback)
+
+    async def connect(self):
+        """
+        Connects to the server, sends the name of the player and starts
+        receiving the states.
+
+        Returns:
+            tuple: The first state, as get_state.
+        """
+        if self.player not in ('WHITE', 'BLACK'):
+            raise ConnectionError("Player must be WHITE or BLACK!")
+        port = self.port or (5800 if self.player == 'WHITE' else 5801)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setblocking(False)
+        # The moves are small, they must not wait for more data to be sent
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(loop.sock_connect(self.sock, (self.server_ip, port)), self.timeout)
+
+        self.reader = FrameReader(self.sock)
+        self.writer = FrameWriter(self.sock)
+        self.states = asyncio.Queue()
+        await self.writer.write_frame(self.name.encode())
+        self.reader_task = asyncio.ensure_future(self._read_states())
+        return await self.get_state()
+
+    async def _read_states(self):
+        try:
+            while True:
+                payload = await self.reader.read_frame()
+                state, turn = self.converter.json_to_matrix(json.loads(str(payload, 'utf-8')))
+                payload.release()
+                if turn not in OUTCOMES:
+                    self.turn, self.state = turn, state
+                for callback in self.listeners:
+                    callback(state, turn)
+                self.states.put_nowait((state, turn))
+                if turn in OUTCOMES:
+                    return
+        except (ConnectionError, ValueError, KeyError) as e:
+            # get_state raises it in turn
+            self.states.put_nowait(e)
+
+    async def get_state(self):
+        """
+        Waits for the next state sent by the server.
+
+        Returns:
+            tuple: (state, turn) while the game goes on, else the outcome
+            as (0, "WHITE WINS!"), (1, "BLACK WINS!") or (2, "DRAW!").
+
+        Raises:
+            ConnectionError: If the connection was lost.
+        """
+        item = await self.states.get()
+        if isinstance(item, Exception):
+            raise item
+        state, turn = item
+        return OUTCOMES.get(turn, (state, turn))
+
+    async def send_move(self, move):
+        _from, _to = move
+        move = json.dumps({"from": _from, "to": _to, "turn": self.player})
+        await self.writer.write_frame(move.encode())
+        return move
+
+    def check_turn(self, player):
+        """
+        Tells whether player is to move in the last state received, which
+        can be more recent than the last one returned by get_state.
+        """
+        return self.turn == player
+
+    async def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+            try:
+                await self.reader_task
+            except asyncio.CancelledError:
+                pass
+            self.reader_task = None
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+class EchoServer:
+    def __init__(self, host='localhost', port=0, chunk=None):
+        """
+        Sends every length-prefixed frame back to its sender.
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port to listen on, 0 picks a free one (see self.port).
+            chunk (int): If given, the frames are sent back chunk bytes at a
+                time, so that the client receives them in pieces.
+        """
+        self.host = host
+        self.port = port
+        self.chunk = chunk
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                frame = header + await reader.readexactly(HEADER.unpack(header)[0])
+                step = self.chunk or len(frame)
+                for i in range(0, len(frame), step):
+                    writer.write(frame[i:i + step])
+                    await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def echo_async(port, payloads):
+    """
+    Sends payloads one at a time to an EchoServer with FrameWriter and
+    receives them back with FrameReader.
+
+    Returns:
+        float: The seconds taken.
+
+    Raises:
+        ValueError: If a payload does not come back intact.
+    """
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    await loop.sock_connect(sock, ('localhost', port))
+    reader, writer = FrameReader(sock, size=64), FrameWriter(sock, size=64)
+    start = time.perf_counter()
+    try:
+        for payload in payloads:
+            await writer.write_frame(payload)
+            if await reader.read_frame() != payload:
+                raise ValueError("A frame came back corrupted")
+    finally:
+        sock.close()
+    return time.perf_counter() - start
+
+
+def echo_sync(port, payloads):
+    """
+    The same as echo_async with the blocking framing of Network.
+    """
+    network = Network('echo', 'WHITE')
+    network.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    network.sock.connect(('localhost', port))
+    start = time.perf_counter()
+    try:
+        for payload in payloads:
+            network.send_message(payload)
+            if network.recv_message() != payload:
+                raise ValueError("A frame came back corrupted")
+    finally:
+        network.sock.close()
+    return time.perf_counter() - start
+
+
+async def echo_benchmark(messages=10000, size=1200, chunk=None):
+    """
+    Times the round trips of messages frames of about size bytes through
+    an EchoServer, with AsyncNetwork's framing and with Network's.
+
+    Returns:
+        dict: The round trips per second of 'async' and 'sync'.
+    """
+    server = EchoServer(chunk=chunk)
+    await server.start()
+    # Different lengths, so that the buffers have to grow
+    payloads = [bytes([i % 256]) * (size + i % 7) for i in range(messages)]
+    try:
+        elapsed_async = await echo_async(server.port, payloads)
+        elapsed_sync = await asyncio.get_running_loop().run_in_executor(
+            None, echo_sync, server.port, payloads)
+    finally:
+        await server.close()
+    return {'async': messages / elapsed_async, 'sync': messages / elapsed_sync}
+
+
+async def random_player(network, rng):
+    """
+    Connects network and plays random legal moves until the game ends,
+    recording every state the listeners receive.
+
+    Returns:
+        tuple: (outcome, states, heard): the outcome as returned by
+        get_state, the number of states returned by get_state and the turns
+        passed to the listener.
+    """
+    from tablut import Tablut
+
+    game = Tablut()
+    heard = []
+    network.add_listener(lambda state, turn: heard.append(turn))
+    try:
+        state, turn = await network.connect()
+        states = 1
+        while not isinstance(state, int):
+            game.update_state(state, turn)
+            # Not check_turn: the next state may already have been received
+            if turn == network.player:
+                move = rng.choice(sorted(game.initial.legal_moves()))
+                await network.send_move(game.convert_move(move))
+            state, turn = await network.get_state()
+            states += 1
+    finally:
+        await network.close()
+    return state, states, heard
+
+
+async def game_check(max_plies=200, seed=0):
+    """
+    Plays a game of random moves between two AsyncNetwork clients through
+    an arena.LocalServer run in a thread, and checks that both clients saw
+    every state the server sent and the outcome it declared.
+
+    Returns:
+        dict: The 'outcome' and the 'plies' of the game.
+
+    Raises:
+        ValueError: If a client and the server disagree.
+    """
+    from arena import LocalServer
+
+    server = LocalServer(port=0, timeout=10, max_plies=max_plies)
+    clients = [random_player(AsyncNetwork(player, player, port=port), random.Random(seed + i))
+               for i, (player, port) in enumerate(zip(('WHITE', 'BLACK'), server.ports))]
+    loop = asyncio.get_running_loop()
+    with contextlib.redirect_stdout(io.StringIO()):
+        served = loop.run_in_executor(None, server.serve)
+        *played, result = await asyncio.gather(*clients, served)
+
+    outcome = OUTCOMES[result['outcome']][0]
+    for player, (client_outcome, states, heard) in zip(('WHITE', 'BLACK'), played):
+        # The first state, then one after every move, the last one being the outcome
+        if client_outcome != outcome or states != result['plies'] + 1:
+            raise ValueError(f"{player} got {client_outcome} after {states} states, the server "
+                             f"sent {outcome} after {result['plies'] + 1}")
+        if len(heard) != states or heard[-1] != result['outcome']:
+            raise ValueError(f"The listener of {player} heard {len(heard)} of {states} states")
+    return {'outcome': result['outcome'], 'plies': result['plies']}
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser()
+    subparsers = argparse.add_subparsers(dest="command", required=True)
+
+    echo = subparsers.add_parser("echo", help="Round trips through a local echo server")
+    echo.add_argument(
+        "--messages", help="The number of messages sent", type=int, default=10000)
+    echo.add_argument(
+        "--size", help="The size of the messages in bytes", type=int, default=1200)
+    echo.add_argument(
+        "--chunk", help="The bytes the server sends at a time (0 sends whole frames)", type=int, default=0)
+
+    game = subparsers.add_parser("game", help="Random games through a local arena server")
+    game.add_argument(
+        "--games", help="The number of games", type=int, default=5)
+    game.add_argument(
+        "--max-plies", help="The number of moves after which a game is a draw", type=int, default=200)
+    game.add_argument(
+        "--seed", help="The seed of the random moves", type=int, default=0)
+    args = argparse.parse_args()
+
+    if args.command == "echo":
+        result = asyncio.run(echo_benchmark(args.messages, args.size, args.chunk or None))
+        print(f"ASYNC: {result['async']:.0f} round trips/s")
+        print(f"SYNC: {result['sync']:.0f} round trips/s")
+    else:
+        for i in range(args.games):
+            result = asyncio.run(game_check(args.max_plies, args.seed + 2 * i))
+            print(f"Game {i + 1}: {result['outcome']} after {result['plies']} moves")
@@ -0,0 +1,408 @@
+"""
+Headless self-play arena.
+
+The Referee replays the role of the Java game server: it keeps the board,
+checks that every move is legal, applies the captures and declares the end
+of the game (king captured or escaped, no legal moves, a position repeated,
+or too many moves). Games can be played in-process between two EnginePlayer
+(and many of them in parallel, one per worker process), or served on a
+localhost socket with the same length-prefixed JSON protocol of the real
+server, so that the unmodified play.py clients can connect to it.
+
+    python arena.py match --games 20 --workers 4
+    python arena.py serve --port 5800
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# numpy
+import numpy as np
+
+# Tablut Class
+from tablut import Tablut
+
+# heuristics
+from whiteheuristics import WHITE_WEIGHTS
+from blackheuristics import BLACK_WEIGHTS
+
+# utils
+from utils import Pawn, initial_pieces
+
+WHITEWIN, BLACKWIN, DRAW = 'WHITEWIN', 'BLACKWIN', 'DRAW'
+OUTCOMES = (WHITEWIN, BLACKWIN, DRAW)
+
+
+def parse_move(move):
+    """
+    Converts a move in the (A1, A2) format of the server to ((x1, y1), (x2, y2)),
+    the inverse of Tablut.convert_move.
+    """
+    return tuple((int(cell[1:]) - 1, ord(cell[0].upper()) - ord('A')) for cell in move)
+
+
+class Referee:
+    def __init__(self, pieces=None, max_plies=200):
+        """
+        Starts a game.
+
+        Args:
+            pieces (numpy.ndarray): The starting position, the standard one if None.
+            max_plies (int): The number of moves after which the game is a draw.
+        """
+        self.game = Tablut()
+        self.game.update_state(
+            initial_pieces() if pieces is None else pieces, 'WHITE')
+        self.board = self.game.initial
+        self.max_plies = max_plies
+        self.plies = 0
+        self.turn = 'WHITE'
+        # Positions (side to move included) seen so far, for the repetitions
+        self.seen = {self.board.hash}
+
+    @property
+    def over(self):
+        return self.turn in OUTCOMES
+
+    def state(self):
+        """
+        Returns the state in the JSON layout of the server, which
+        Converter.json_to_matrix reads back.
+        """
+        return {"board": [[Pawn(int(v)).name for v in row] for row in self.board.pieces],
+                "turn": self.turn}
+
+    def play(self, move):
+        """
+        Plays a move for the side to move and updates the outcome.
+
+        An illegal move loses the game, as with the real server.
+
+        Args:
+            move (tuple): ((x1, y1), (x2, y2)) or the (A1, A2) server format.
+
+        Returns:
+            str: The new turn: WHITE, BLACK, WHITEWIN, BLACKWIN or DRAW.
+        """
+        if self.over:
+            raise ValueError(f"The game is over: {self.turn}")
+        player = self.turn
+        winner = WHITEWIN if player == 'BLACK' else BLACKWIN
+
+        if move is not None and isinstance(move[0], str):
+            move = parse_move(move)
+        if move is None or tuple(map(tuple, move)) not in self.board.legal_moves():
+            self.turn = winner
+            return self.turn
+
+        self.board.make_move(tuple(map(tuple, move)))
+        self.plies += 1
+        opponent = self.board.to_move
+
+        if self.game.check_win(self.board, player):
+            self.turn = WHITEWIN if player == 'WHITE' else BLACKWIN
+        elif self.game.check_win(self.board, opponent):
+            self.turn = winner
+        elif not self.board.legal_moves():
+            # A player that can't move loses
+            self.turn = WHITEWIN if player == 'WHITE' else BLACKWIN
+        elif self.board.hash in self.seen or self.plies >= self.max_plies:
+            self.turn = DRAW
+        else:
+            self.seen.add(self.board.hash)
+            self.turn = opponent
+        return self.turn
+
+
+class EnginePlayer:
+    def __init__(self, depth=2, time_limit=10, tt_size=16, white_weights=WHITE_WEIGHTS, black_weights=BLACK_WEIGHTS):
+        """
+        An iterative deepening alpha-beta player.
+
+        Args:
+            depth (int): The deepest iteration of the search.
+            time_limit (float): The seconds available for each move.
+            tt_size (float): The memory cap in MB of its transposition table.
+            white_weights, black_weights (tuple): The weights of its heuristics.
+        """
+        self.depth = depth
+        self.time_limit = time_limit
+        self.tt_size = tt_size
+        self.weights = (tuple(white_weights), tuple(black_weights))
+        self.game = self.tt = None
+
+    def new_game(self):
+        from transposition import TranspositionTable
+        self.game = Tablut(white_weights=self.weights[0], black_weights=self.weights[1])
+        self.tt = TranspositionTable(max_mb=self.tt_size)
+
+    def __call__(self, game, board):
+        from play import iterative_deepening_search
+        # The search scores the positions with the weights of this player
+        return iterative_deepening_search(board, self.game, time_limit=self.time_limit,
+                                          tt=self.tt, max_depth=self.depth)
+
+
+def play_match(white, black, opening_plies=0, seed=0, max_plies=200, verbose=False):
+    """
+    Plays a game in-process between two players.
+
+    Args:
+        white, black: Callables taking (game, board) and returning a move.
+        opening_plies (int): Random moves played before the engines take over,
+            so that games between the same players differ.
+        seed (int): The seed of the random opening.
+        max_plies (int): The number of moves after which the game is a draw.
+        verbose (bool): Keep the output of the searches.
+
+    Returns:
+        dict: 'outcome', 'plies' and 'latencies' (seconds taken by each engine move).
+    """
+    rng = random.Random(seed)
+    referee = Referee(max_plies=max_plies)
+    players = {'WHITE': white, 'BLACK': black}
+    for player in players.values():
+        if hasattr(player, 'new_game'):
+            player.new_game()
+
+    for _ in range(opening_plies):
+        if referee.over:
+            break
+        referee.play(rng.choice(sorted(referee.board.legal_moves())))
+
+    latencies = []
+    while not referee.over:
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        start = time.perf_counter()
+        with output:
+            move = players[referee.turn](referee.game, referee.board.copy())
+        latencies.append(time.perf_counter() - start)
+        referee.play(move)
+
+    return {'outcome': referee.turn, 'plies': referee.plies, 'latencies': latencies}
+
+
+# Length-prefixed JSON messages, as exchanged by Network and the server
+def send_message(sock, message):
+    data = json.dumps(message).encode()
+    sock.sendall(struct.pack('>i', len(data)) + data)
+
+
+def recvall(sock, n):
+    data = b''
+    while len(data) < n:
+        packet = sock.recv(n - len(data))
+        if not packet:
+            raise ConnectionError("The client closed the connection")
+        data += packet
+    return data
+
+
+def recv_message(sock, decode=json.loads):
+    length = struct.unpack('>i', recvall(sock, 4))[0]
+    return decode(recvall(sock, length))
+
+
+class LocalServer:
+    def __init__(self, host='localhost', port=5800, timeout=60, max_plies=200):
+        """
+        A stand-in for the Java game server, refereeing one game between two
+        socket clients: WHITE connects to port, BLACK to port + 1 (port 0
+        picks two free ports, see self.ports).
+
+        Args:
+            host (str): The address to listen on.
+            port (int): The port of WHITE.
+            timeout (float): The seconds a client has to send its move.
+            max_plies (int): The number of moves after which the game is a draw.
+        """
+        self.timeout = timeout
+        self.max_plies = max_plies
+        self.listeners = {}
+        for player, offset in (('WHITE', 0), ('BLACK', 1)):
+            listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            listener.bind((host, port + offset if port else 0))
+            listener.listen(1)
+            self.listeners[player] = listener
+        self.ports = tuple(l.getsockname()[1]
+                           for l in self.listeners.values())
+
+    def serve(self):
+        """
+        Waits for both players, referees the game and returns its outcome.
+
+        Returns:
+            dict: 'outcome', 'plies', 'latencies' and the 'names' of the players.
+        """
+        clients, names = {}, {}
+        try:
+            for player, listener in self.listeners.items():
+                clients[player], _ = listener.accept()
+                names[player] = recv_message(clients[player], bytes.decode)
+                clients[player].settimeout(self.timeout)
+
+            referee = Referee(max_plies=self.max_plies)
+            latencies = []
+            for client in clients.values():
+                send_message(client, referee.state())
+            while not referee.over:
+                start = time.perf_counter()
+                try:
+                    message = recv_message(clients[referee.turn])
+                    move = (message['from'], message['to'])
+                except (OSError, ValueError, KeyError):
+                    # A timeout or a malformed message loses the game
+                    move = None
+                latencies.append(time.perf_counter() - start)
+                referee.play(move)
+                for client in clients.values():
+                    send_message(client, referee.state())
+        finally:
+            for s in list(clients.values()) + list(self.listeners.values()):
+                s.close()
+
+        return {'outcome': referee.turn, 'plies': referee.plies,
+                'latencies': latencies, 'names': names}
+
+
+def _socket_match(time_limit, max_plies):
+    """
+    Plays a game through a LocalServer on free ports between two play.py
+    clients run in threads. The clients search with the settings of
+    play.py, so the depths of the match do not apply, but neither ponder
+    nor use the opening book or the endgame solver, so that they only play
+    what they search and do not take the CPU from each other.
+    """
+    from play import play_game
+
+    server = LocalServer(port=0, timeout=time_limit + 5, max_plies=max_plies)
+    clients = [threading.Thread(target=play_game, daemon=True,
+                                kwargs=dict(name=team, team=team, server_ip='localhost',
+                                            timeout=time_limit + 5, port=port, tt_size=16,
+                                            ponder=False, book_path=None, endgame_time=0))
+               for team, port in zip(('WHITE', 'BLACK'), server.ports)]
+    for client in clients:
+        client.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        result = server.serve()
+    for client in clients:
+        client.join()
+    return result
+
+
+def _arena_game(index, args):
+    """
+    Plays the game index of a match in a worker process. Player A is WHITE
+    in the even games and BLACK in the odd ones, except through the socket
+    where it plays both sides.
+    """
+    if args.socket:
+        return _socket_match(args.time, args.max_plies)
+
+    a = EnginePlayer(depth=args.depth_a, time_limit=args.time)
+    b = EnginePlayer(depth=args.depth_b, time_limit=args.time)
+    white, black = (a, b) if index % 2 == 0 else (b, a)
+    result = play_match(white, black, opening_plies=args.opening_plies,
+                        seed=args.seed + index // 2, max_plies=args.max_plies)
+    result['a_white'] = index % 2 == 0
+    return result
+
+
+def report(results, elapsed):
+    """
+    Prints the throughput, the move latencies and the outcomes of a match,
+    by colour and, when the games tell its colour, for player A.
+    """
+    games = len(results)
+    plies = sum(r['plies'] for r in results)
+    latencies = np.array([t for r in results for t in r['latencies']])
+    print(f"{games} games, {plies} moves in {elapsed:.2f}s: "
+          f"{games / elapsed:.3f} games/s, {plies / elapsed:.1f} moves/s")
+    if len(latencies):
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1000
+        print(f"move latency: p50 {p50:.1f}ms p90 {p90:.1f}ms p99 {p99:.1f}ms "
+              f"max {latencies.max() * 1000:.1f}ms")
+
+    by_colour = {o: sum(r['outcome'] == o for r in results) for o in OUTCOMES}
+    print("WHITE wins {WHITEWIN}, BLACK wins {BLACKWIN}, draws {DRAW}".format(**by_colour))
+    if not all('a_white' in r for r in results):
+        return
+
+    wins = sum(r['outcome'] == (WHITEWIN if r['a_white'] else BLACKWIN) for r in results)
+    draws = by_colour[DRAW]
+    losses = games - wins - draws
+    print(f"A: {wins / games:.1%} wins, {draws / games:.1%} draws, {losses / games:.1%} losses")
+
+
+def match(args):
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        results = list(pool.map(_arena_game, range(args.games),
+                                [args] * args.games))
+    report(results, time.perf_counter() - start)
+
+
+def serve(args):
+    server = LocalServer(host=args.host, port=args.port,
+                         timeout=args.timeout, max_plies=args.max_plies)
+    print(f"Waiting for WHITE on {server.ports[0]} and BLACK on {server.ports[1]}")
+    result = server.serve()
+    print(f"{result['names']['WHITE']} vs {result['names']['BLACK']}: "
+          f"{result['outcome']} after {result['plies']} moves")
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser()
+    subparsers = argparse.add_subparsers(dest="command", required=True)
+
+    parser = subparsers.add_parser(
+        "match", help="Play games between two engine players, in parallel")
+    parser.add_argument(
+        "--games", help="The number of games", type=int, default=10)
+    parser.add_argument(
+        "--workers", help="The number of games played at the same time", type=int, default=None)
+    parser.add_argument(
+        "--depth-a", help="The search depth of player A (default 2)", type=int, default=None)
+    parser.add_argument(
+        "--depth-b", help="The search depth of player B (default 2)", type=int, default=None)
+    parser.add_argument(
+        "--time", help="The seconds available for each move", type=float, default=10)
+    parser.add_argument(
+        "--opening-plies", help="Random moves played at the start of every game", type=int, default=4)
+    parser.add_argument(
+        "--max-plies", help="The number of moves after which a game is a draw", type=int, default=200)
+    parser.add_argument(
+        "--seed", help="The seed of the random openings", type=int, default=0)
+    parser.add_argument(
+        "--socket", help="Play through a local server and two play.py clients (player A on both sides)",
+        action="store_true")
+    parser.set_defaults(func=match)
+    match_parser = parser
+
+    parser = subparsers.add_parser(
+        "serve", help="Referee one game between two socket clients, like the game server")
+    parser.add_argument(
+        "--host", help="The address to listen on", type=str, default="localhost")
+    parser.add_argument(
+        "--port", help="The port of WHITE, BLACK uses the next one", type=int, default=5800)
+    parser.add_argument(
+        "--timeout", help="The seconds a player has to move", type=float, default=60)
+    parser.add_argument(
+        "--max-plies", help="The number of moves after which the game is a draw", type=int, default=200)
+    parser.set_defaults(func=serve)
+
+    args = argparse.parse_args()
+    if args.command == "match":
+        if args.socket and (args.depth_a is not None or args.depth_b is not None):
+            match_parser.error("--depth-a and --depth-b do not apply with --socket")
+        args.depth_a = 2 if args.depth_a is None else args.depth_a
+        args.depth_b = 2 if args.depth_b is None else args.depth_b
+    args.func(args)
@@ -0,0 +1,511 @@
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+# numpy
+import numpy as np
+
+# Tablut Class
+from tablut import Tablut
+from board import Board, COLOURS
+
+# heuristics
+from whiteheuristics import white_fitness
+from blackheuristics import black_fitness
+
+# search
+from parallel import ParallelSearcher
+from transposition import TranspositionTable
+
+# self-play
+from arena import Referee, EnginePlayer
+
+# utils
+from utils import Pawn, RED, RED2, initial_pieces
+
+# The positions of the suite, written by the corpus command
+CORPUS_PATH = 'bench_corpus.json'
+CATEGORIES = ('start', 'midgame', 'endgame')
+
+
+def legacy_actions(pieces, player, board):
+    """
+    The candidate-enumeration move generator that Tablut.actions used before
+    the bitboard engine: every pawn is paired with all the 81 squares and the
+    forbidden pairs are subtracted from the candidates.
+
+    Kept here as the reference the bitboard generator is checked and timed against.
+    """
+    white = list(zip(*np.where(pieces == Pawn.WHITE.value)))
+    black = list(zip(*np.where(pieces == Pawn.BLACK.value)))
+    king = list(zip(*np.where(pieces == Pawn.KING.value)))[0]
+    white.insert(0, king)
+
+    player_pieces = white if player == 'WHITE' else black
+    opponent_pieces = black if player == 'WHITE' else white
+    squares = [[x, (k, l)] for x in player_pieces for k in range(9)
+               for l in range(9)]
+
+    occupied_squares = set(
+        map(tuple, player_pieces + opponent_pieces + [(4, 4)]))
+    forbidden_moves = set()
+    for from_pos, to_pos in squares:
+        from_row, from_col = from_pos
+        to_row, to_col = to_pos
+
+        for occ_place in occupied_squares:
+            forbidden_moves.add((from_pos, occ_place))
+        forbidden_moves.add((from_pos, from_pos))
+
+        if from_row != to_row and from_col != to_col:
+            forbidden_moves.add((from_pos, to_pos))
+
+        flags = [False, False, False, False]
+        in_camp = board[from_row][from_col] in (RED, RED2)
+        for i in range(1, 9):
+            if from_col - i >= 0:
+                if flags[0] or (from_row, from_col - i) in occupied_squares or \
+                        (not in_camp and board[from_row][from_col - i] in (RED, RED2)):
+                    flags[0] = True
+                    forbidden_moves.add((from_pos, (from_row, from_col - i)))
+            if from_row - i >= 0:
+                if flags[1] or (from_row - i, from_col) in occupied_squares or \
+                        (not in_camp and board[from_row - i][from_col] in (RED, RED2)):
+                    flags[1] = True
+                    forbidden_moves.add((from_pos, (from_row - i, from_col)))
+            if from_col + i < 9:
+                if flags[2] or (from_row, from_col + i) in occupied_squares or \
+                        (not in_camp and board[from_row][from_col + i] in (RED, RED2)):
+                    flags[2] = True
+                    forbidden_moves.add((from_pos, (from_row, from_col + i)))
+            if from_row + i < 9:
+                if flags[3] or (from_row + i, from_col) in occupied_squares or \
+                        (not in_camp and board[from_row + i][from_col] in (RED, RED2)):
+                    flags[3] = True
+                    forbidden_moves.add((from_pos, (from_row + i, from_col)))
+
+    total_moves = set(tuple(tuple(k) for k in h) for h in squares)
+    return total_moves - forbidden_moves
+
+
+def sample_positions(n, plies=20, seed=0):
+    """
+    Returns n (pieces, player) positions reached by random play from the
+    starting position (captures are not applied, the positions only need to
+    be legal piece layouts).
+    """
+    rng = random.Random(seed)
+    game = Tablut()
+    positions = []
+    for _ in range(n):
+        pieces = initial_pieces()
+        player = 'WHITE'
+        for _ in range(rng.randrange(plies + 1)):
+            moves = sorted(game.actions(pieces, player, None))
+            if not moves:
+                break
+            (x1, y1), (x2, y2) = rng.choice(moves)
+            pieces[x2][y2] = pieces[x1][y1]
+            pieces[x1][y1] = Pawn.THRONE.value if (
+                x1, y1) == (4, 4) else Pawn.EMPTY.value
+            player = 'BLACK' if player == 'WHITE' else 'WHITE'
+        positions.append((pieces, player))
+    return positions
+
+
+def bench_actions(generator, positions, board, min_time=1.0):
+    """
+    Times generator over positions until min_time seconds have elapsed.
+
+    Returns:
+        tuple: (calls per second, moves per second)
+    """
+    calls = moves = 0
+    start = time.perf_counter()
+    while True:
+        for pieces, player in positions:
+            moves += len(generator(pieces, player, board))
+            calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return calls / elapsed, moves / elapsed
+
+
+def movegen(args):
+    game = Tablut()
+    board = COLOURS
+    positions = sample_positions(args.positions, seed=args.seed)
+
+    # Both generators have to agree before their speed means anything
+    for pieces, player in positions:
+        expected = legacy_actions(pieces, player, board)
+        actual = game.actions(pieces, player, board)
+        if expected != actual:
+            raise AssertionError(
+                f"Move sets differ for {player}:\n{pieces}\n"
+                f"missing: {expected - actual}\nextra: {actual - expected}")
+
+    print(f"{len(positions)} positions, move sets identical")
+    results = {}
+    for name, generator in (('legacy', legacy_actions), ('bitboard', game.actions)):
+        calls, moves = bench_actions(
+            generator, positions, board, min_time=args.time)
+        results[name] = moves
+        print(f"{name:>10}: {calls:12.1f} calls/s {moves:14.1f} moves/s")
+    print(f"{'speedup':>10}: {results['bitboard'] / results['legacy']:.1f}x")
+
+
+def parallel(args):
+    positions = sample_positions(args.positions, seed=args.seed)
+    game = Tablut()
+
+    baseline = None
+    workers = 1
+    while workers <= args.max_workers:
+        # A fresh pool per worker count, so no transposition table is warm
+        searcher = ParallelSearcher(workers, tt_size=args.tt_size)
+        nodes = 0
+        # Start the worker processes before the clock does
+        game.update_state(*positions[0])
+        board = game.initial.copy()
+        searcher.search_depth(board, 1, time.time() + 3600,
+                              sorted(board.legal_moves()))
+        start = time.perf_counter()
+        try:
+            for pieces, player in positions:
+                game.update_state(pieces, player)
+                board = game.initial.copy()
+                result = searcher.search_depth(
+                    board, args.depth, time.time() + 3600, sorted(board.legal_moves()))
+                nodes += result['nodes']
+        finally:
+            searcher.shutdown()
+        elapsed = time.perf_counter() - start
+
+        rate = nodes / elapsed
+        baseline = baseline or rate
+        print(f"{workers:>3} workers: {nodes:10d} nodes {elapsed:8.2f}s "
+              f"{rate:12.1f} nodes/s {rate / baseline:6.2f}x")
+        workers *= 2
+
+
+def king_near_edge(board, distance=2):
+    """
+    Returns whether the king is within distance squares of an edge of the board.
+    """
+    if board.king is None:
+        return False
+    return any(c < distance or c >= board.width - distance for c in board.king)
+
+
+def build_corpus(midgames=8, endgames=8, seed=0, max_games=100):
+    """
+    Samples positions from self-play games between 1-ply engines, with a
+    random move now and then so that the games differ.
+
+    Args:
+        midgames (int): The positions wanted between ply 10 and 40 with the
+            king away from the edges.
+        endgames (int): The positions wanted with the king near an edge.
+        seed (int): The seed of the random moves and of the sampling.
+        max_games (int): The number of games after which to give up.
+
+    Returns:
+        list: {'category', 'to_move', 'pieces'} dicts, the pieces as a
+        string of 81 Pawn values; the start position comes first.
+    """
+    rng = random.Random(seed)
+    engine = EnginePlayer(depth=1)
+    wanted = {'midgame': midgames, 'endgame': endgames}
+    corpus = [{'category': 'start', 'to_move': 'WHITE',
+               'pieces': ''.join(map(str, initial_pieces().ravel()))}]
+    seen = set()
+
+    for _ in range(max_games):
+        if not any(wanted.values()):
+            break
+        referee = Referee(max_plies=120)
+        engine.new_game()
+        endgame_taken = False
+        while not referee.over:
+            board = referee.board
+            # The king rarely stays near an edge for long: the first such
+            # position of a game is taken, a midgame one now and then
+            if king_near_edge(board):
+                category = None if endgame_taken else 'endgame'
+            elif 10 <= referee.plies <= 40 and rng.random() < 0.2:
+                category = 'midgame'
+            else:
+                category = None
+            if category and wanted[category] and board.hash not in seen:
+                seen.add(board.hash)
+                wanted[category] -= 1
+                endgame_taken = endgame_taken or category == 'endgame'
+                corpus.append({'category': category, 'to_move': board.to_move,
+                               'pieces': ''.join(map(str, board.pieces.ravel()))})
+            if rng.random() < 0.25:
+                move = rng.choice(sorted(board.legal_moves()))
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    move = engine(referee.game, board.copy())
+            referee.play(move)
+    return corpus
+
+
+def load_corpus(path):
+    """
+    Returns the (category, Board) positions of the corpus at path.
+    """
+    with open(path) as f:
+        entries = json.load(f)
+    positions = []
+    for entry in entries:
+        board = Board(to_move=entry['to_move'])
+        board.load(np.array([int(c) for c in entry['pieces']]).reshape(9, 9))
+        positions.append((entry['category'], board))
+    return positions
+
+
+def time_calls(calls, min_time, repeat=5):
+    """
+    Makes every (function, arguments) call of calls in turn until min_time
+    seconds have elapsed, repeat times.
+
+    Returns:
+        float: The calls per second of the fastest round, the others being
+        slowed down by whatever else the machine was doing.
+    """
+    best = 0.0
+    for _ in range(repeat):
+        n = 0
+        start = time.perf_counter()
+        while True:
+            for func, args in calls:
+                func(*args)
+            n += len(calls)
+            elapsed = time.perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, n / elapsed)
+    return best
+
+
+def trace_calls(calls):
+    """
+    Makes every call of calls once under tracemalloc.
+
+    Returns:
+        tuple: (peak, retained) bytes allocated by the calls: the highest
+        amount of memory in use at once and what is still in use after them.
+    """
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for func, args in calls:
+        func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    # The search closures are reference cycles, only freed by the collector
+    gc.collect()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return peak - base, current - base
+
+
+def suite_calls(positions, depth, seed=0, moves_per_position=4):
+    """
+    Prepares the calls timed by the suite.
+
+    Returns:
+        dict: {'operation/category': [(function, arguments), ...]}
+    """
+    rng = random.Random(seed)
+    game = Tablut()
+    tt = TranspositionTable(max_mb=4)
+    # A cold table for every search, so that the repetitions do the same work
+    from play import cutoff_depth, h_alphabeta_search
+
+    def search(board):
+        tt.clear()
+        return h_alphabeta_search(board, game, cutoff_depth(depth - 1), time_limit=3600, tt=tt)
+
+    def check_attacks(board, x, y):
+        # The captured pieces are put back for the next repetition
+        for pos, value in board.check_attacks(x, y):
+            board._add_piece(pos, value)
+
+    calls = {}
+    for category, board in positions:
+        moves = sorted(board.legal_moves())
+        # The capturing moves first, then a random sample of the others
+        capturing = [move for move in moves if board.captures(move)]
+        others = [move for move in moves if move not in capturing]
+        sample = (capturing + rng.sample(others, len(others)))[:moves_per_position]
+
+        # Boards where the piece has been moved and the captures are pending
+        moved = []
+        for from_pos, to_pos in sample:
+            after = board.copy()
+            piece = int(after.pieces[from_pos])
+            after.pieces[from_pos] = Pawn.THRONE.value if from_pos == (4, 4) else Pawn.EMPTY.value
+            after.pieces[to_pos] = piece
+            after._move_piece(piece, from_pos, to_pos)
+            moved.append((after, to_pos))
+
+        for name, items in (
+                ('actions', [(game.actions, (board.pieces, board.to_move, None))]),
+                ('result', [(game.result, (board, move)) for move in sample]),
+                ('check_attacks', [(check_attacks, (after,) + to_pos) for after, to_pos in moved]),
+                ('white_fitness', [(white_fitness, (board,))]),
+                ('black_fitness', [(black_fitness, (board,))]),
+                (f'search_d{depth}', [(search, (board,))])):
+            calls.setdefault(f'{name}/{category}', []).extend(items)
+    return calls
+
+
+def run_suite(positions, depth=2, min_time=0.2, repeat=5):
+    """
+    Times every operation of the suite on every category of positions.
+
+    Returns:
+        dict: {'operation/category': {'ops_per_sec', 'peak_bytes', 'retained_bytes'}}
+    """
+    results = {}
+    for name, calls in suite_calls(positions, depth).items():
+        # The searches print their root wins
+        with contextlib.redirect_stdout(io.StringIO()):
+            # A first pass warms the caches of the interpreter
+            for func, args in calls:
+                func(*args)
+            rate = time_calls(calls, min_time, repeat)
+            peak, retained = trace_calls(calls)
+        results[name] = {'ops_per_sec': rate, 'peak_bytes': peak, 'retained_bytes': retained}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Returns the names of the results slower than the baseline by more than
+    threshold (a fraction), or whose peak memory grew by more than threshold.
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slower = result['ops_per_sec'] < base['ops_per_sec'] * (1 - threshold)
+        # Small peaks move by a few hundred bytes from run to run
+        heavier = result['peak_bytes'] > max(base['peak_bytes'] * (1 + threshold),
+                                             base['peak_bytes'] + 1024)
+        if slower or heavier:
+            regressions.append(name)
+    return regressions
+
+
+def corpus(args):
+    entries = build_corpus(args.midgames, args.endgames, seed=args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(entries, f, indent=1)
+    counts = {c: sum(e['category'] == c for e in entries) for c in CATEGORIES}
+    print(f"{len(entries)} positions written to {args.output}: {counts}")
+
+
+def suite(args):
+    positions = load_corpus(args.corpus)
+    results = run_suite(positions, depth=args.depth, min_time=args.time, repeat=args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+
+    for name, result in results.items():
+        line = (f"{name:>24}: {result['ops_per_sec']:12.1f} ops/s "
+                f"{result['peak_bytes'] / 1024:10.1f} KB peak {result['retained_bytes'] / 1024:8.1f} KB retained")
+        if baseline and name in baseline:
+            line += f" {result['ops_per_sec'] / baseline[name]['ops_per_sec'] - 1:+7.1%}"
+        if name in regressions:
+            line += " REGRESSION"
+        print(line)
+
+    if args.save:
+        report = {'python': platform.python_version(), 'numpy': np.__version__,
+                  'machine': platform.machine(), 'processor': platform.processor(),
+                  'corpus': args.corpus, 'depth': args.depth,
+                  'date': time.strftime('%Y-%m-%dT%H:%M:%S'), 'results': results}
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=1)
+        print(f"Baseline written to {args.save}")
+
+    if regressions:
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser()
+    subparsers = argparse.add_subparsers(dest="benchmark", required=True)
+
+    parser = subparsers.add_parser(
+        "movegen", help="Moves/sec of Tablut.actions against the legacy generator")
+    parser.add_argument(
+        "--positions", help="The number of sampled positions", type=int, default=50)
+    parser.add_argument(
+        "--seed", help="The seed of the position sampler", type=int, default=0)
+    parser.add_argument(
+        "--time", help="Seconds spent timing each generator", type=float, default=2.0)
+    parser.set_defaults(func=movegen)
+
+    parser = subparsers.add_parser(
+        "parallel", help="Nodes/sec of the root-parallel search for 1, 2, 4... workers")
+    parser.add_argument(
+        "--positions", help="The number of sampled positions", type=int, default=4)
+    parser.add_argument(
+        "--seed", help="The seed of the position sampler", type=int, default=0)
+    parser.add_argument(
+        "--depth", help="The depth of the searches in plies", type=int, default=3)
+    parser.add_argument(
+        "--max-workers", help="The largest worker count", type=int, default=os.cpu_count())
+    parser.add_argument(
+        "--tt-size", help="The transposition table of each worker in MB", type=float, default=16)
+    parser.set_defaults(func=parallel)
+
+    parser = subparsers.add_parser(
+        "corpus", help="Samples the positions of the suite from self-play")
+    parser.add_argument(
+        "--midgames", help="The number of midgame positions", type=int, default=8)
+    parser.add_argument(
+        "--endgames", help="The number of positions with the king near an edge", type=int, default=8)
+    parser.add_argument(
+        "--seed", help="The seed of the self-play games", type=int, default=0)
+    parser.add_argument(
+        "--output", help="The file the corpus is written to", type=str, default=CORPUS_PATH)
+    parser.set_defaults(func=corpus)
+
+    parser = subparsers.add_parser(
+        "suite", help="Ops/sec and memory of the rules, the evaluation and the search on the corpus")
+    parser.add_argument(
+        "--corpus", help="The corpus written by the corpus command", type=str, default=CORPUS_PATH)
+    parser.add_argument(
+        "--depth", help="The depth of the timed searches in plies", type=int, default=2)
+    parser.add_argument(
+        "--time", help="Seconds of every timing round of an operation", type=float, default=0.2)
+    parser.add_argument(
+        "--repeat", help="The timing rounds of every operation, the fastest is kept", type=int, default=5)
+    parser.add_argument(
+        "--save", help="Write the results to this file as a baseline", type=str, default=None)
+    parser.add_argument(
+        "--compare", help="A baseline to compare the results with", type=str, default=None)
+    parser.add_argument(
+        "--threshold", help="The slowdown (or memory growth) flagged as a regression", type=float, default=0.1)
+    parser.set_defaults(func=suite)
+
+    args = argparse.parse_args()
+    args.func(args)
@@ -0,0 +1,217 @@
+"""
+Bitboard move generation for the 9x9 Tablut board.
+
+Every square (row, col) is mapped to the bit ``row * 9 + col`` of a Python
+integer, so a set of squares (the white pawns, the camps, the occupied
+squares...) is a single int and set operations are plain bitwise operators.
+The rays leaving each square in the four directions are precomputed once at
+import time, and so are the resulting move tuples, so generating the moves of
+a pawn is a handful of bit operations plus one slice per direction.
+"""
+import numpy as np
+
+# utils
+from utils import Pawn
+
+# board geometry
+from geometry import (SIZE, NUM_SQUARES, SQUARES, square, THRONE, CAMPS, ESCAPES,
+                      NORTH, SOUTH, WEST, EAST, DIRECTIONS, STEPS, RAY_SQUARES,
+                      NEIGHBOURS, AROUND, QUADRANTS, ESCAPE_RAYS)
+
+# Single bit of every square index
+SQUARE_BB = tuple(1 << sq for sq in range(NUM_SQUARES))
+
+
+def to_mask(positions):
+    """Return the bitboard holding all the given (row, col) positions."""
+    mask = 0
+    for row, col in positions:
+        mask |= 1 << square(row, col)
+    return mask
+
+
+def iter_squares(mask):
+    """Yield the square indexes of the bits set in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+THRONE_BB = to_mask([THRONE])
+CAMPS_BB = to_mask(CAMPS)
+ESCAPES_BB = to_mask(ESCAPES)
+
+# RAYS[direction][sq]: bitboard of the squares reachable from sq on an empty
+# board going in that direction (sq excluded)
+RAYS = tuple(
+    tuple(to_mask(SQUARES[s] for s in RAY_SQUARES[direction][sq])
+          for sq in range(NUM_SQUARES))
+    for direction in range(4)
+)
+
+# RAY_MOVES[direction][sq]: the moves along that ray, nearest target first
+RAY_MOVES = tuple(
+    tuple(tuple((SQUARES[sq], SQUARES[s]) for s in RAY_SQUARES[direction][sq])
+          for sq in range(NUM_SQUARES))
+    for direction in range(4)
+)
+
+
+# NEIGHBOURS_BB[sq]: bitboard of the (up to four) squares next to sq
+NEIGHBOURS_BB = tuple(sum(SQUARE_BB[n] for n, _ in NEIGHBOURS[sq])
+                      for sq in range(NUM_SQUARES))
+
+# AROUND_BB[distance][sq]: bitboard of the squares within distance of sq
+AROUND_BB = (None,) + tuple(
+    tuple(sum(SQUARE_BB[s] for s in around) for around in AROUND[distance])
+    for distance in (1, 2)
+)
+
+# QUADRANTS_BB[n]: bitboard of the quadrant n of the board
+QUADRANTS_BB = tuple(sum(SQUARE_BB[s] for s in quadrant) for quadrant in QUADRANTS)
+
+
+def _between(a, b):
+    for direction in range(4):
+        ray = RAY_SQUARES[direction][a]
+        if b in ray:
+            return to_mask(SQUARES[s] for s in ray[:ray.index(b)])
+    return None
+
+
+# BETWEEN[a][b]: bitboard of the squares strictly between a and b when they
+# share a row or a column, None otherwise
+BETWEEN = tuple(tuple(_between(a, b) for b in range(NUM_SQUARES))
+                for a in range(NUM_SQUARES))
+
+# ESCAPE_RAYS_BB[sq]: ESCAPE_RAYS[sq] as bitboards
+ESCAPE_RAYS_BB = tuple(tuple(sum(SQUARE_BB[s] for s in line) for line in ESCAPE_RAYS[sq])
+                       for sq in range(NUM_SQUARES))
+
+
+def count(mask):
+    """Return the number of squares in mask."""
+    return bin(mask).count('1')
+
+
+def first_blocker(sq, direction, blockers):
+    """
+    Return the first of the blockers met leaving sq in direction, None if
+    the ray is free up to the edge of the board.
+    """
+    blocked = RAYS[direction][sq] & blockers
+    if not blocked:
+        return None
+    if direction == SOUTH or direction == EAST:
+        return (blocked & -blocked).bit_length() - 1
+    return blocked.bit_length() - 1
+
+
+def ray_length(sq, direction, blockers):
+    """
+    Return how many squares a pawn on sq can travel in direction before
+    bumping into one of the blockers.
+    """
+    first = first_blocker(sq, direction, blockers)
+    if first is None:
+        return len(RAY_MOVES[direction][sq])
+    return abs(first - sq) // abs(STEPS[direction]) - 1
+
+
+def clear_view(a, b, occupied):
+    """
+    Return whether squares a and b share a row or a column with none of the
+    occupied squares between them.
+    """
+    between = BETWEEN[a][b]
+    return between is not None and not between & occupied
+
+
+def in_sight(sq, occupied):
+    """
+    Return the bitboard of the occupied squares seen from sq: the first one
+    met in each of the four directions.
+    """
+    mask = 0
+    for direction in range(4):
+        first = first_blocker(sq, direction, occupied)
+        if first is not None:
+            mask |= SQUARE_BB[first]
+    return mask
+
+
+def open_escapes(sq, occupied):
+    """
+    Return the bitboard of the squares a king on sq crosses to reach an
+    escape square in one move, 0 when it cannot.
+    """
+    # The camps stop the king as well as the pawns
+    blockers = occupied | CAMPS_BB
+    lines = 0
+    for line in ESCAPE_RAYS_BB[sq]:
+        if not line & blockers:
+            lines |= line
+    return lines
+
+
+def pawn_moves(sq, occupied):
+    """
+    Return the list of moves of the pawn on sq.
+
+    Args:
+        sq (int): The square index of the pawn.
+        occupied (int): Bitboard of every occupied square (throne included).
+
+    Returns:
+        list: The ((x1, y1), (x2, y2)) moves of the pawn.
+    """
+    blockers = occupied
+    # Camps can only be crossed by the pawns that are still inside them
+    if not SQUARE_BB[sq] & CAMPS_BB:
+        blockers |= CAMPS_BB
+
+    moves = []
+    for direction in range(4):
+        n = ray_length(sq, direction, blockers)
+        if n:
+            moves.extend(RAY_MOVES[direction][sq][:n])
+    return moves
+
+
+def legal_moves(own, occupied):
+    """
+    Return the set of moves available to the pawns in own.
+
+    Args:
+        own (int): Bitboard of the pawns of the player to move (king included for WHITE).
+        occupied (int): Bitboard of every occupied square.
+
+    Returns:
+        set: The ((x1, y1), (x2, y2)) moves.
+    """
+    occupied |= THRONE_BB
+    moves = set()
+    for sq in iter_squares(own):
+        moves.update(pawn_moves(sq, occupied))
+    return moves
+
+
+def from_pieces(pieces):
+    """
+    Build the bitboards of a pieces matrix.
+
+    Args:
+        pieces (numpy.ndarray): The 9x9 matrix of Pawn values.
+
+    Returns:
+        tuple: The (white, black, king) bitboards.
+    """
+    flat = np.asarray(pieces).ravel()
+    bitboards = []
+    for value in (Pawn.WHITE.value, Pawn.BLACK.value, Pawn.KING.value):
+        mask = 0
+        for sq in np.flatnonzero(flat == value):
+            mask |= SQUARE_BB[sq]
+        bitboards.append(mask)
+    return tuple(bitboards)
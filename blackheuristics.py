@@ -1,7 +1,16 @@
 # Black heuristics
-def black_fitness(board):
+
+# move generation
+import bitboard
+
+# alpha0, beta0, gamma0, theta0, epsilon0
+BLACK_WEIGHTS = (0.958245251997756, 0.25688393654958275,
+                 0.812052344592159, 0.9193347856045799, 1.7870310915100207)
+
+
+def black_fitness(board, weights=BLACK_WEIGHTS):
     """
-    Black heuristics should be based on:
+    Black heuristics (weights as in BLACK_WEIGHTS) should be based on:
     - Number of black pawns
     - Number of white pawns
     - Number of black pawns next to the king
@@ -11,9 +20,9 @@ def black_fitness(board):
 
     fitness = 0
 
-    alpha0, beta0, gamma0, theta0, epsilon0 = [0.958245251997756, 0.25688393654958275, 0.812052344592159, 0.9193347856045799, 1.7870310915100207]
+    alpha0, beta0, gamma0, theta0, epsilon0 = weights
 
-    king_pos = board.get_king()
+    king_pos = board.king
 
     # Number of black pawns
     fitness += alpha0 * len(board.blacks)
@@ -25,13 +34,12 @@ def black_fitness(board):
     fitness += gamma0 * pawns_around(board, king_pos, distance=1)
 
     # Free path to the king
-    free_paths = [board._is_there_a_clear_view(black_pawn, king_pos)
-                  for black_pawn in board.blacks]
+    free_paths = board.free_paths(king_pos)
     # theta0 times the n° free ways to king
-    fitness += theta0 * sum(free_paths)
+    fitness += theta0 * free_paths
 
     # norm_fitness = (fitness / (alpha0 * len(board.blacks) + gamma0 *
-    #                           pawns_around(board, king_pos, distance=2) + theta0 * sum(free_paths)))
+    #                           pawns_around(board, king_pos, distance=2) + theta0 * free_paths))
 
     # print("BLACK FITNESS: ", norm_fitness)
 
@@ -40,14 +48,7 @@ def black_fitness(board):
 
 def pawns_around(board, pawn, distance: int):
     """
-    Returns the number of pawns around a given pawn within a certain distance (usually the king)
+    Returns the number of black pawns around a given pawn within a certain distance (1 or 2, usually the king)
     """
-    x, y = pawn
-    count = 0
-    for i in range(-distance, distance+1):
-        for j in range(-distance, distance+1):
-            if i == 0 and j == 0:
-                continue
-            if (x+i, y+j) in board.blacks:
-                count += 1
-    return count
+    around = bitboard.AROUND_BB[distance][bitboard.square(*pawn)]
+    return bitboard.count(around & board.black_bb)
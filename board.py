@@ -1,48 +1,74 @@
 import time
-from collections import defaultdict
 
 import numpy as np
 
+# move generation
+import bitboard
+
+# position hashing
+from zobrist import PIECE_KEYS, TURN_KEY
+
+# evaluation features
+from features import compute_features, update_features
+
 # utils
 from utils import Pawn, WHITE, WHITE2, RED, RED2, GREEN, GREEN2, BLUE, GRAY
 
+# The colour of every square, shared by all the boards
+COLOURS = (
+    (GRAY, WHITE, WHITE2, RED2, RED, RED2, WHITE2, WHITE, GRAY),
+    (WHITE, WHITE2, WHITE, WHITE2, RED2, WHITE2, WHITE, WHITE2, WHITE),
+    (WHITE2, WHITE, WHITE2, WHITE, GREEN, WHITE, WHITE2, WHITE, WHITE2),
+    (RED2, WHITE2, WHITE, WHITE2, GREEN2, WHITE2, WHITE, WHITE2, RED2),
+    (RED, RED2, GREEN, GREEN2, BLUE, GREEN2, GREEN, RED2, RED),
+    (RED2, WHITE2, WHITE, WHITE2, GREEN2, WHITE2, WHITE, WHITE2, RED2),
+    (WHITE2, WHITE, WHITE2, WHITE, GREEN, WHITE, WHITE2, WHITE, WHITE2),
+    (WHITE, WHITE2, WHITE, WHITE2, RED2, WHITE2, WHITE, WHITE2, WHITE),
+    (GRAY, WHITE, WHITE2, RED2, RED, RED2, WHITE2, WHITE, GRAY),
+)
 
-class Board(defaultdict):
-    empty = Pawn.EMPTY
-    off = '#'
-
-    def __init__(self, width, height, to_move, **kwds):
-        self.__dict__.update(width=width, height=height,
-                             to_move=to_move, **kwds)
-
-        self.board = [
-            [GRAY, WHITE, WHITE2, RED2, RED, RED2, WHITE2, WHITE, GRAY],
-            [WHITE, WHITE2, WHITE, WHITE2, RED2, WHITE2, WHITE, WHITE2, WHITE],
-            [WHITE2, WHITE, WHITE2, WHITE, GREEN, WHITE, WHITE2, WHITE, WHITE2],
-            [RED2, WHITE2, WHITE, WHITE2, GREEN2, WHITE2, WHITE, WHITE2, RED2],
-            [RED, RED2, GREEN, GREEN2, BLUE, GREEN2, GREEN, RED2, RED],
-            [RED2, WHITE2, WHITE, WHITE2, GREEN2, WHITE2, WHITE, WHITE2, RED2],
-            [WHITE2, WHITE, WHITE2, WHITE, GREEN, WHITE, WHITE2, WHITE, WHITE2],
-            [WHITE, WHITE2, WHITE, WHITE2, RED2, WHITE2, WHITE, WHITE2, WHITE],
-            [GRAY, WHITE, WHITE2, RED2, RED, RED2, WHITE2, WHITE, GRAY],
-        ]
-
-        self.winning_positions = set([(0, 1), (0, 2), (0, 7), (0, 8), (1, 0), (2, 0), (2, 8), (
-            1, 8), (6, 0), (6, 8), (7, 0), (7, 8), (8, 1), (8, 2), (8, 6), (8, 7)])
-
-    # AIMA methods
-    def to_move(self, state):
-        return self.__dict__['to_move']
-
-    def __missing__(self, loc):
-        x, y = loc
-        if 0 <= x < self.width and 0 <= y < self.height:
-            return self.empty
-        else:
-            return self.off
+WINNING_POSITIONS = frozenset(bitboard.ESCAPES)
+
+
+class Board:
+    """
+    A Tablut position: the 9x9 int8 matrix of Pawn values, the piece lists,
+    the bitboards, the Zobrist hash and the evaluation features, kept in
+    sync by make_move/unmake_move.
+
+    The static geometry is shared by all the instances, so a board only holds
+    its own pieces and copying one is cheap.
+    """
+    __slots__ = ('width', 'height', 'to_move', 'utility', 'pieces', 'whites', 'blacks',
+                 'slots', 'white_bb', 'black_bb', 'king_bb', 'king', 'hash', 'features',
+                 'white_moves_to_eat')
+
+    board = COLOURS
+    winning_positions = WINNING_POSITIONS
+
+    def __init__(self, width=9, height=9, to_move='WHITE', utility=0):
+        self.width = width
+        self.height = height
+        self.to_move = to_move
+        self.utility = utility
+
+    @property
+    def white(self):
+        return self.whites
+
+    @property
+    def black(self):
+        return self.blacks
 
     def __hash__(self):
-        return hash(tuple(sorted(self.items()))) + hash(self.to_move)
+        return self.hash
+
+    def __eq__(self, other):
+        if not isinstance(other, Board):
+            return NotImplemented
+        return (self.hash == other.hash and self.to_move == other.to_move and
+                self.white_bb == other.white_bb and self.black_bb == other.black_bb and
+                self.king_bb == other.king_bb)
 
     def __str__(self):
         """
@@ -51,112 +77,310 @@ class Board(defaultdict):
         """
         return str(self.pieces)
 
+    def copy(self):
+        """
+        Returns a copy of the board that can be moved on independently.
+        """
+        new = Board.__new__(Board)
+        new.width = self.width
+        new.height = self.height
+        new.to_move = self.to_move
+        new.utility = self.utility
+        new.pieces = self.pieces.copy()
+        new.whites = list(self.whites)
+        new.blacks = list(self.blacks)
+        new.slots = self.slots[:]
+        new.white_bb = self.white_bb
+        new.black_bb = self.black_bb
+        new.king_bb = self.king_bb
+        new.king = self.king
+        new.hash = self.hash
+        new.features = self.features
+        return new
+
     # Board methods
+    def load(self, pieces):
+        """
+        Sets the pieces of the board and rebuilds the piece lists and bitboards from them.
+        """
+        self.pieces = np.array(pieces, dtype=np.int8)
+        flat = self.pieces.ravel()
+        occupied = np.flatnonzero(flat)
+
+        # A single pass over the occupied squares, in row-major order, builds
+        # the piece lists, the bitboards and the hash
+        whites, blacks = [], []
+        white_bb = black_bb = king_bb = 0
+        h = TURN_KEY if self.to_move == 'BLACK' else 0
+        self.king = None
+        for sq, value in zip(occupied.tolist(), flat[occupied].tolist()):
+            if value == Pawn.WHITE.value:
+                whites.append(bitboard.SQUARES[sq])
+                white_bb |= bitboard.SQUARE_BB[sq]
+            elif value == Pawn.BLACK.value:
+                blacks.append(bitboard.SQUARES[sq])
+                black_bb |= bitboard.SQUARE_BB[sq]
+            elif value == Pawn.KING.value:
+                self.king = bitboard.SQUARES[sq]
+                king_bb = bitboard.SQUARE_BB[sq]
+            else:
+                # The throne
+                continue
+            h ^= PIECE_KEYS[value][sq]
+        if self.king is not None:
+            whites.insert(0, self.king)
+        self.whites, self.blacks = whites, blacks
+        self.white_bb, self.black_bb, self.king_bb = white_bb, black_bb, king_bb
+        self.hash = h
+
+        # Index of the piece on every square in whites or blacks
+        self.slots = bytearray(bitboard.NUM_SQUARES)
+        for side in (whites, blacks):
+            for i, (x, y) in enumerate(side):
+                self.slots[x * 9 + y] = i
+
+        self.features = compute_features(self)
+
+    @property
+    def occupied(self):
+        """
+        Bitboard of the squares that are not empty in pieces: every pawn,
+        the king and the throne.
+        """
+        return self.white_bb | self.black_bb | self.king_bb | bitboard.THRONE_BB
+
+    def legal_moves(self):
+        """
+        Returns the set of moves of the player to move, generated from the maintained bitboards.
+        """
+        if self.to_move == 'WHITE':
+            own = self.white_bb | self.king_bb
+        else:
+            own = self.black_bb
+        return bitboard.legal_moves(own, self.white_bb | self.black_bb | self.king_bb)
+
+    def make_move(self, move):
+        """
+        Applies a move in place: the pawn is moved, the captures are resolved and the turn is passed.
+
+        Args:
+            move (tuple): A tuple containing the starting and ending positions of the move.
+
+        Returns:
+            tuple: The undo record to be given back to unmake_move.
+        """
+        from_pos, to_pos = move
+        piece = int(self.pieces[from_pos])
+
+        # The throne stays marked once the king leaves it
+        self.pieces[from_pos] = Pawn.THRONE.value if from_pos == bitboard.THRONE else Pawn.EMPTY.value
+        self.pieces[to_pos] = piece
+        self._move_piece(piece, from_pos, to_pos)
+
+        captured = self.check_attacks(*to_pos)
+
+        features = self.features
+        self.features = update_features(features, self, move, piece, captured)
+
+        to_move = self.to_move
+        self.to_move = "BLACK" if to_move == "WHITE" else "WHITE"
+        self.hash ^= TURN_KEY
+        return move, piece, captured, to_move, features
+
+    def unmake_move(self, undo):
+        """
+        Restores the board exactly as it was before the make_move call that returned undo.
+        """
+        (from_pos, to_pos), piece, captured, to_move, features = undo
+
+        for pos, value in reversed(captured):
+            self._add_piece(pos, value)
+
+        self.pieces[to_pos] = Pawn.EMPTY.value
+        self.pieces[from_pos] = piece
+        self._move_piece(piece, to_pos, from_pos)
+
+        self.to_move = to_move
+        self.hash ^= TURN_KEY
+        self.features = features
+
+    def _move_piece(self, piece, from_pos, to_pos):
+        from_sq = bitboard.square(*from_pos)
+        to_sq = bitboard.square(*to_pos)
+        mask = bitboard.SQUARE_BB[from_sq] | bitboard.SQUARE_BB[to_sq]
+        keys = PIECE_KEYS[piece]
+        self.hash ^= keys[from_sq] ^ keys[to_sq]
+        if piece == Pawn.BLACK.value:
+            self.black_bb ^= mask
+            pieces = self.blacks
+        else:
+            if piece == Pawn.KING.value:
+                self.king_bb ^= mask
+                self.king = to_pos
+            else:
+                self.white_bb ^= mask
+            pieces = self.whites
+        i = self.slots[from_sq]
+        pieces[i] = to_pos
+        self.slots[to_sq] = i
+
+    def _add_piece(self, pos, value):
+        sq = bitboard.square(*pos)
+        bit = bitboard.SQUARE_BB[sq]
+        self.pieces[pos] = value
+        self.hash ^= PIECE_KEYS[value][sq]
+        if value == Pawn.BLACK.value:
+            self.black_bb |= bit
+            self.slots[sq] = len(self.blacks)
+            self.blacks.append(pos)
+        elif value == Pawn.WHITE.value:
+            self.white_bb |= bit
+            self.slots[sq] = len(self.whites)
+            self.whites.append(pos)
+        else:
+            # The king goes back in front of the white pawns
+            self.king_bb |= bit
+            self.king = pos
+            self.whites.insert(0, pos)
+            self._reindex_whites()
+
+    def _remove_piece(self, pos, value):
+        sq = bitboard.square(*pos)
+        bit = bitboard.SQUARE_BB[sq]
+        self.hash ^= PIECE_KEYS[value][sq]
+        if value == Pawn.KING.value:
+            self.pieces[pos] = Pawn.THRONE.value if pos == bitboard.THRONE else Pawn.EMPTY.value
+            self.king_bb &= ~bit
+            self.king = None
+            del self.whites[0]
+            self._reindex_whites()
+            return
+        self.pieces[pos] = Pawn.EMPTY.value
+        if value == Pawn.BLACK.value:
+            self.black_bb &= ~bit
+            pieces = self.blacks
+        else:
+            self.white_bb &= ~bit
+            pieces = self.whites
+        # The last piece of the list takes the place of the removed one
+        i = self.slots[sq]
+        last = pieces.pop()
+        if last != pos:
+            pieces[i] = last
+            self.slots[last[0] * 9 + last[1]] = i
+
+    def _reindex_whites(self):
+        for i, (x, y) in enumerate(self.whites):
+            self.slots[x * 9 + y] = i
+
     def get_white(self):
         pawns = np.where(self.pieces == Pawn.WHITE.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
-        self.white = coordinates
+        coordinates = list(zip(pawns[0].tolist(), pawns[1].tolist()))
+        self.whites = coordinates
 
         king = self.get_king()
         if king is not None:
-            self.white.insert(0, king)
-
-        self.whites = self.white
+            self.whites.insert(0, king)
         return coordinates
 
     def get_black(self):
         pawns = np.where(self.pieces == Pawn.BLACK.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
-        self.black = coordinates
-        self.blacks = self.black
+        coordinates = list(zip(pawns[0].tolist(), pawns[1].tolist()))
+        self.blacks = coordinates
         return coordinates
 
     def get_king(self):
         pawns = np.where(self.pieces == Pawn.KING.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
+        coordinates = list(zip(pawns[0].tolist(), pawns[1].tolist()))
         try:
             self.king = coordinates[0]
             return coordinates[0]
         except IndexError:  # king has been captured
+            self.king = None
             return None
 
     def _is_there_a_clear_view(self, piece1, piece2):
-        if piece1[0] == piece2[0]:
-            offset = 1 if piece1[1] <= piece2[1] else -1
-            for i in range(piece1[1] + offset, piece2[1], offset):
-                if self.pieces[piece1[0]][i] != 0:
-                    return False
+        if tuple(piece1) == tuple(piece2):
             return True
-        elif piece1[1] == piece2[1]:
-            offset = 1 if piece1[0] <= piece2[0] else -1
-            for i in range(piece1[0] + offset, piece2[0], offset):
-                if self.pieces[i][piece1[1]] != 0:
-                    return False
-            return True
-        else:
-            return False
+        return bitboard.clear_view(bitboard.square(*piece1), bitboard.square(*piece2), self.occupied)
+
+    def free_paths(self, pos):
+        """
+        Returns the number of black pawns with a clear view of pos.
+        """
+        seen = bitboard.in_sight(bitboard.square(*pos), self.occupied)
+        return bitboard.count(seen & self.black_bb)
 
     def check_attacks(self, x, y):
-        # Horizontal check
-        if x > 1:
-            if self.pieces[x-2][y] == self.pieces[x][y] and self.pieces[x-1][y] != self.pieces[x][y]:
-                self.pieces[x-1][y] = 0
-                has_deleted = False
-                for black in self.blacks:
-                    if black[0] == x-1 and black[1] == y:
-                        del black
-                        has_deleted = True
-                        break
-                if not has_deleted:
-                    for white in self.whites:
-                        if white[0] == x-1 and white[1] == y:
-                            del white
-                            break
-        if x < len(self.pieces)-2:
-            if self.pieces[x+2][y] == self.pieces[x][y] and self.pieces[x+1][y] != self.pieces[x][y]:
-                self.pieces[x+1][y] = 0
-                has_deleted = False
-                for black in self.blacks:
-                    if black[0] == x-1 and black[1] == y:
-                        del black
-                        has_deleted = True
-                        break
-                if not has_deleted:
-                    for white in self.whites:
-                        if white[0] == x-1 and white[1] == y:
-                            del white
-                            break
-        # Vertical check
-        if y > 1:
-            if self.pieces[x][y-2] == self.pieces[x][y] and self.pieces[x][y-1] != self.pieces[x][y]:
-                self.pieces[x][y-1] = 0
-                has_deleted = False
-                for black in self.blacks:
-                    if black[0] == x-1 and black[1] == y:
-                        del black
-                        has_deleted = True
-                        break
-                if not has_deleted:
-                    for white in self.whites:
-                        if white[0] == x-1 and white[1] == y:
-                            del white
-                            break
-        if y < len(self.pieces)-2:
-            if self.pieces[x][y+2] == self.pieces[x][y] and self.pieces[x][y+1] != self.pieces[x][y]:
-                self.pieces[x][y+1] = 0
-                has_deleted = False
-                for black in self.blacks:
-                    if black[0] == x-1 and black[1] == y:
-                        del black
-                        has_deleted = True
-                        break
-                if not has_deleted:
-                    for white in self.whites:
-                        if white[0] == x-1 and white[1] == y:
-                            del white
-                            break
-
-        return self
+        """
+        Resolves the captures made by the piece that has just moved to (x, y).
+
+        A pawn is captured when it is sandwiched, along a row or a column,
+        between the moved piece and a piece of the same side, a camp (unless
+        the pawn stands in a camp itself) or the empty throne. The king is
+        captured by four black pawns in the throne, by three next to it (the
+        throne closing the fourth side) and elsewhere like a pawn by two.
+
+        Returns:
+            list: The (position, value) of every captured piece, for unmake_move.
+        """
+        captured = [(bitboard.SQUARES[sq], value) for sq, value in self._captured(
+            bitboard.square(x, y), self.pieces[x][y] == Pawn.BLACK.value,
+            self.white_bb, self.black_bb, self.king_bb)]
+        for pos, value in captured:
+            self._remove_piece(pos, value)
+        return captured
+
+    def captures(self, move):
+        """
+        Returns the (square, value) of the pieces move would capture, without playing it.
+        """
+        (from_pos, to_pos) = move
+        from_sq = bitboard.square(*from_pos)
+        to_sq = bitboard.square(*to_pos)
+        mask = bitboard.SQUARE_BB[from_sq] | bitboard.SQUARE_BB[to_sq]
+        white, black, king = self.white_bb, self.black_bb, self.king_bb
+        if black & mask:
+            black ^= mask
+        elif king & mask:
+            king ^= mask
+        else:
+            white ^= mask
+        return self._captured(to_sq, bool(black & mask), white, black, king)
+
+    @staticmethod
+    def _captured(sq, black_mover, white, black, king):
+        """
+        The capture rules of check_attacks on the bitboards of a position
+        where the piece that has just moved stands on sq.
+        """
+        empty_throne = bitboard.THRONE_BB & ~king
+        if black_mover:
+            friends, enemies, value = black, white, Pawn.WHITE.value
+        else:
+            friends, enemies, value = white | king, black, Pawn.BLACK.value
+
+        captured = []
+        for near, beyond in bitboard.NEIGHBOURS[sq]:
+            bit = bitboard.SQUARE_BB[near]
+            if bit & enemies:
+                if beyond is None:
+                    continue
+                hostile = friends | empty_throne
+                if not bit & bitboard.CAMPS_BB:
+                    hostile |= bitboard.CAMPS_BB
+                if bitboard.SQUARE_BB[beyond] & hostile:
+                    captured.append((near, value))
+            elif bit & king and black_mover:
+                if bit & bitboard.THRONE_BB or bitboard.NEIGHBOURS_BB[near] & bitboard.THRONE_BB:
+                    # Every side of the king but the throne is black
+                    sides = bitboard.NEIGHBOURS_BB[near] & ~bitboard.THRONE_BB
+                    if sides & ~black:
+                        continue
+                elif beyond is None or not bitboard.SQUARE_BB[beyond] & (friends | bitboard.CAMPS_BB):
+                    continue
+                captured.append((near, Pawn.KING.value))
+        return captured
 
     def eat_black(self):
         '''
@@ -213,38 +437,13 @@ class Board(defaultdict):
 
     def check_num_pieces_in_quadrant(self, n_quadrant, black_or_white):
         """
-        Returns the number of pieces in the quadrant of selected color
+        Returns the number of pawns of the selected color in the quadrant
         (1 = left up, 2 = right up, 3 = left down, 4 = right down)
         """
-        if black_or_white not in (1, 2):
-            raise Exception("The color must be 1 (black) or 2 (white)")
-
-        num_pieces = 0
-        if n_quadrant == 1:
-            quadrant = [row[:4] for row in self.board[:4]]
-            for i in range(4):
-                for j in range(4):
-                    if quadrant[i][j] == black_or_white:
-                        num_pieces += 1
-        elif n_quadrant == 2:
-            quadrant = [row[5:] for row in self.board[:4]]
-            for i in range(4):
-                for j in range(4):
-                    if quadrant[i][j] == black_or_white:
-                        num_pieces += 1
-        elif n_quadrant == 3:
-            quadrant = [row[:4] for row in self.board[5:]]
-            for i in range(4):
-                for j in range(4):
-                    if quadrant[i][j] == black_or_white:
-                        num_pieces += 1
-        elif n_quadrant == 4:
-            quadrant = [row[5:] for row in self.board[5:]]
-            for i in range(4):
-                for j in range(4):
-                    if quadrant[i][j] == black_or_white:
-                        num_pieces += 1
-        else:
+        if black_or_white not in (Pawn.WHITE.value, Pawn.BLACK.value):
+            raise Exception("The color must be 1 (white) or 2 (black)")
+        if n_quadrant not in (1, 2, 3, 4):
             raise Exception("The quadrant number must be between 1 and 4")
 
-        return num_pieces
+        pawns = self.white_bb if black_or_white == Pawn.WHITE.value else self.black_bb
+        return bitboard.count(pawns & bitboard.QUADRANTS_BB[n_quadrant - 1])
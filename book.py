@@ -0,0 +1,178 @@
+"""
+Opening book of the standard Tablut start.
+
+The first plies of every game start from the same position, so their best
+moves can be searched once, offline and much deeper than the time of a move
+allows. build_book searches the start position and, ply after ply, the
+positions reached by the best few moves of each searched one, and save_book
+writes the (Zobrist hash, best move) pairs sorted by hash in a flat binary
+file. OpeningBook memory-maps the file: a lookup is a binary search on the
+mapped keys, which takes microseconds and does not load the book in memory.
+
+Build a book with:
+
+    python book.py --plies 6 --width 3 --depth 4
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+# Tablut Class
+from tablut import Tablut
+
+# search
+from transposition import TranspositionTable, encode_move, decode_move
+from ordering import MoveOrderer
+
+# utils
+from utils import WinException, initial_pieces
+
+MAGIC = b'TBLTBOOK'
+
+# The records of the file, packed: 11 bytes each
+RECORD = np.dtype([('key', '<u8'), ('move', '<i2'), ('depth', 'u1')])
+
+
+class OpeningBook:
+    def __init__(self, path):
+        """
+        Maps the book at path.
+
+        Raises:
+            ValueError: If the file is not an opening book.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not an opening book")
+        size = (os.path.getsize(path) - len(MAGIC)) // RECORD.itemsize
+        self.path = path
+        self.records = np.memmap(path, dtype=RECORD, mode='r',
+                                 offset=len(MAGIC), shape=(size,)) if size else np.zeros(0, RECORD)
+        # Plain views of the mapping, indexing a memmap is slower
+        self.keys = np.asarray(self.records['key'])
+        self.moves = np.asarray(self.records['move'])
+        self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.records)
+
+    def probe(self, h):
+        """
+        Returns the book move of the position with hash h, or None.
+        """
+        i = int(np.searchsorted(self.keys, np.uint64(h)))
+        if i < len(self.keys) and int(self.keys[i]) == h:
+            self.hits += 1
+            return decode_move(int(self.moves[i]))
+        self.misses += 1
+        return None
+
+
+def save_book(path, book):
+    """
+    Writes the {hash: (move, depth)} entries of book to path, sorted by hash.
+    """
+    records = np.zeros(len(book), dtype=RECORD)
+    for i, (h, (move, depth)) in enumerate(sorted(book.items())):
+        records[i] = (h, encode_move(move), depth)
+    # Written aside and renamed, so that a player never maps half a file
+    with open(path + '.tmp', 'wb') as f:
+        f.write(MAGIC)
+        f.write(records.tobytes())
+    os.replace(path + '.tmp', path)
+
+
+def search(board, game, depth, tt, orderer):
+    """
+    Iterative deepening search of board up to depth, without time limit.
+
+    Returns:
+        tuple: (best move, {root move: value}); the scores are empty when a
+        root move wins on the spot.
+    """
+    # play imports this module
+    from play import alphabeta, cutoff_depth
+
+    tt.new_search()
+    orderer.new_search()
+    root_moves = None
+    # Exact scores of all the root moves: the best few are followed, so
+    # neither null windows nor aspiration windows are used
+    for d in range(1, depth + 1):
+        try:
+            value, move, scores, nodes = alphabeta(
+                board.copy(), game, cutoff_depth(d - 1), float('inf'), tt, root_moves, orderer=orderer,
+                pvs=False)
+        except WinException as e:
+            return e.args[0], {}
+        root_moves = sorted(scores, key=scores.get, reverse=True)
+        if abs(value) >= 1e10:
+            break
+    return move, scores
+
+
+def build_book(plies=6, width=3, depth=4, tt_size=64):
+    """
+    Searches the positions of the first plies of the game.
+
+    Args:
+        plies (int): The number of plies covered by the book.
+        width (int): The number of best moves of every position whose
+            resulting positions are searched in turn.
+        depth (int): The depth of every search.
+        tt_size (float): The memory cap in MB of each of the two
+            transposition tables.
+
+    Returns:
+        dict: {hash: (best move, depth)} of every position searched.
+    """
+    game = Tablut()
+    game.update_state(initial_pieces(), 'WHITE')
+    # The values in a table are seen from the side to move at the root, so
+    # each side searches with its own table (and killers and history)
+    tables = {side: (TranspositionTable(max_mb=tt_size), MoveOrderer())
+              for side in ('WHITE', 'BLACK')}
+
+    book = {}
+    frontier = [game.initial.copy()]
+    for ply in range(plies):
+        start = time.time()
+        following = []
+        for board in frontier:
+            # The same position can be reached through different moves
+            if board.hash in book or game.terminal_test(board, board.to_move):
+                continue
+            tt, orderer = tables[board.to_move]
+            move, scores = search(board, game, depth, tt, orderer)
+            book[board.hash] = (move, depth)
+
+            for reply in sorted(scores, key=scores.get, reverse=True)[:width]:
+                child = board.copy()
+                child.make_move(reply)
+                following.append(child)
+        print(f"PLY {ply + 1}: {len(frontier)} positions, {len(book)} in the book, "
+              f"{time.time() - start:.1f}s")
+        frontier = following
+    return book
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser()
+
+    argparse.add_argument(
+        "--plies", help="The number of plies covered by the book", type=int, default=6)
+    argparse.add_argument(
+        "--width", help="The best moves of every position followed to the next ply", type=int, default=3)
+    argparse.add_argument(
+        "--depth", help="The search depth of every book position", type=int, default=4)
+    argparse.add_argument(
+        "--tt-size", help="The memory cap in MB of the transposition table of each side", type=float, default=64)
+    argparse.add_argument(
+        "--output", help="The file the book is written to", type=str, default="book.bin")
+    args = argparse.parse_args()
+
+    book = build_book(args.plies, args.width, args.depth, args.tt_size)
+    save_book(args.output, book)
+    print(f"{len(book)} positions written to {args.output}")
@@ -0,0 +1,81 @@
+"""
+Bounded memoization.
+
+LRUCache is a dictionary capped in entries and/or in bytes: when it is
+full, the least recently used entries are evicted to make room. It counts
+its hits, misses and evictions, so that it can be checked whether a cache
+pays for itself.
+"""
+import sys
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    def __init__(self, max_entries=None, max_bytes=None, sizeof=sys.getsizeof):
+        """
+        Creates an empty cache.
+
+        Args:
+            max_entries (int): The maximum number of entries, None for no limit.
+            max_bytes (int): The maximum size of the keys and values, as
+                measured by sizeof, None for no limit.
+            sizeof: The function measuring the size of a key or a value.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.entries = OrderedDict()
+        self.nbytes = 0
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key, default=None):
+        """
+        Returns the value of key and marks it as the most recently used, default if it is missing.
+        """
+        value = self.entries.get(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        """
+        Stores value under key, evicting the least recently used entries if the cache is full.
+        """
+        if key in self.entries:
+            self.nbytes -= self.sizeof(self.entries.pop(key))
+        else:
+            self.nbytes += self.sizeof(key)
+        self.entries[key] = value
+        self.nbytes += self.sizeof(value)
+
+        while self.entries and (
+                (self.max_entries is not None and len(self.entries) > self.max_entries) or
+                (self.max_bytes is not None and self.nbytes > self.max_bytes)):
+            old_key, old_value = self.entries.popitem(last=False)
+            self.nbytes -= self.sizeof(old_key) + self.sizeof(old_value)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
+
+    def stats(self):
+        """
+        Returns the counters of the cache: hits, misses, evictions, hit rate, entries and bytes.
+        """
+        lookups = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': len(self.entries), 'bytes': self.nbytes}
+
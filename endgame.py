@@ -0,0 +1,245 @@
+"""
+Exact solver of the king-escape races.
+
+When the king is close to an open line towards an escape square, or when
+few pieces are left, the outcome is often forced well beyond the depth of
+the heuristic search. EndgameSolver proves it with a proof-number search:
+the side trying to win (the attacker) needs one good move in its nodes, the
+defender has to be beaten in all of its replies, and the search always
+expands the leaf that is cheapest to prove or disprove the root.
+
+The attacker is restricted to the moves of a race: the king moves for
+WHITE, the moves landing next to the king for BLACK. The defender is never
+restricted, so a proof is exact, while a race won with other moves may go
+unproven. A position is only solved within max_plies plies, and a search
+gives up at its time or node limit.
+"""
+import time
+
+# move generation
+import bitboard
+
+# utils
+from utils import Pawn
+
+WIN, LOSS = 'WIN', 'LOSS'
+
+INF = float('inf')
+
+
+class Node:
+    __slots__ = ('move', 'children', 'attacker', 'pn', 'dn', 'dist')
+
+    def __init__(self, move, attacker):
+        self.move = move
+        # Whether the attacker is to move in the node
+        self.attacker = attacker
+        self.children = None
+        self.pn = self.dn = 1
+        # Plies to the end of the game once the node is proven
+        self.dist = None
+
+
+def king_escapes(board):
+    """
+    Returns whether the king can reach an escape square in one move.
+    """
+    if board.king is None:
+        return False
+    return bool(bitboard.open_escapes(bitboard.square(*board.king), board.occupied))
+
+
+def king_capture_moves(board):
+    """
+    Returns the moves of BLACK that land next to the king.
+    """
+    if board.king is None:
+        return []
+    around = bitboard.NEIGHBOURS_BB[bitboard.square(*board.king)]
+    return [move for move in bitboard.legal_moves(board.black_bb, board.occupied)
+            if bitboard.SQUARE_BB[bitboard.square(*move[1])] & around]
+
+
+def king_captured_next(board):
+    """
+    Returns whether BLACK can capture the king in one move.
+    """
+    return any(value == Pawn.KING.value
+               for move in king_capture_moves(board) for _, value in board.captures(move))
+
+
+def winner(board):
+    """
+    Returns the player who has won on board, None if the game goes on.
+    """
+    if board.king is None:
+        return 'BLACK'
+    if board.king_bb & bitboard.ESCAPES_BB or not board.blacks:
+        return 'WHITE'
+    return None
+
+
+class EndgameSolver:
+    def __init__(self, time_limit=2.0, max_plies=9, node_limit=200000, max_pieces=12):
+        """
+        Args:
+            time_limit (float): The seconds a solve call can take.
+            max_plies (int): The longest forced win searched, in plies.
+            node_limit (int): The largest proof tree of a search.
+            max_pieces (int): The material up to which every position is
+                tried; with more pieces only the positions where the king
+                is one move away from an open escape line are.
+        """
+        self.time_limit = time_limit
+        self.max_plies = max_plies
+        self.node_limit = node_limit
+        self.max_pieces = max_pieces
+        self.searches = self.solved = self.nodes = 0
+        self.elapsed = 0.0
+
+    def applicable(self, board):
+        """
+        Returns whether board looks like a race worth solving.
+        """
+        if board.king is None:
+            return False
+        if len(board.whites) + len(board.blacks) <= self.max_pieces:
+            return True
+        for move in bitboard.pawn_moves(bitboard.square(*board.king),
+                                        board.occupied | bitboard.CAMPS_BB):
+            undo = board.make_move(move)
+            escapes = king_escapes(board)
+            board.unmake_move(undo)
+            if escapes:
+                return True
+        return False
+
+    def solve(self, board):
+        """
+        Looks for a forced win of either side.
+
+        Returns:
+            tuple: (WIN, move, plies) when the player to move wins in plies
+            plies at most by playing move, (LOSS, move, plies) when it loses
+            whatever it does (move being the one that lasts longest), None
+            when neither could be proven in time.
+        """
+        start = time.time()
+        board = board.copy()
+        player = board.to_move
+        opponent = 'BLACK' if player == 'WHITE' else 'WHITE'
+        self.searches += 1
+
+        result = None
+        # Half of the time to prove a win, the rest to prove a loss
+        for attacker, deadline in ((player, start + self.time_limit / 2),
+                                   (opponent, start + self.time_limit)):
+            root = self._search(board, attacker, deadline)
+            if root.pn == 0:
+                if attacker == player:
+                    best = min((c for c in root.children if c.pn == 0), key=lambda c: c.dist)
+                    result = (WIN, best.move, root.dist)
+                else:
+                    best = max(root.children, key=lambda c: c.dist)
+                    result = (LOSS, best.move, root.dist)
+                break
+
+        self.elapsed += time.time() - start
+        if result is not None:
+            self.solved += 1
+        return result
+
+    def stats(self):
+        """
+        Returns the counters of the solver: searches, positions solved,
+        nodes of the proof trees and seconds spent.
+        """
+        return {'searches': self.searches, 'solved': self.solved,
+                'nodes': self.nodes, 'time': self.elapsed}
+
+    def _search(self, board, attacker, deadline):
+        """
+        Proof-number search of board, where attacker tries to win.
+        """
+        root = Node(None, board.to_move == attacker)
+        nodes = 1
+        while root.pn and root.dn and nodes < self.node_limit and time.time() < deadline:
+            # Down to the most proving leaf
+            path, undos, node = [root], [], root
+            while node.children:
+                if node.attacker:
+                    node = min(node.children, key=lambda c: c.pn)
+                else:
+                    node = min(node.children, key=lambda c: c.dn)
+                undos.append(board.make_move(node.move))
+                path.append(node)
+
+            nodes += self._expand(board, node, attacker, len(undos))
+
+            for node in reversed(path):
+                self._update(node)
+            for undo in reversed(undos):
+                board.unmake_move(undo)
+        self.nodes += nodes
+        return root
+
+    def _expand(self, board, node, attacker, ply):
+        """
+        Creates the children of node and returns how many there are.
+        """
+        if ply >= self.max_plies:
+            node.pn, node.dn = INF, 0
+            node.children = []
+            return 0
+
+        if not node.attacker:
+            moves = board.legal_moves()
+        elif attacker == 'WHITE':
+            moves = bitboard.pawn_moves(bitboard.square(*board.king),
+                                        board.occupied | bitboard.CAMPS_BB)
+        else:
+            moves = king_capture_moves(board)
+
+        children = []
+        for move in moves:
+            child = Node(move, not node.attacker)
+            undo = board.make_move(move)
+            won = winner(board)
+            if won is None:
+                # A win on the next move is as good as done
+                if board.to_move == 'WHITE' and king_escapes(board):
+                    won, child.dist = 'WHITE', 1
+                elif board.to_move == 'BLACK' and king_captured_next(board):
+                    won, child.dist = 'BLACK', 1
+            else:
+                child.dist = 0
+            board.unmake_move(undo)
+
+            if won == attacker:
+                child.pn, child.dn = 0, INF
+            elif won is not None:
+                child.pn, child.dn = INF, 0
+            children.append(child)
+
+        node.children = children
+        if not children:
+            # No move: the attacker gives up, the defender loses
+            node.pn, node.dn = (INF, 0) if node.attacker else (0, INF)
+            node.dist = 0
+        return len(children)
+
+    @staticmethod
+    def _update(node):
+        children = node.children
+        if not children:
+            return
+        if node.attacker:
+            node.pn = min(c.pn for c in children)
+            node.dn = sum(c.dn for c in children)
+            if node.pn == 0:
+                node.dist = 1 + min(c.dist for c in children if c.pn == 0)
+        else:
+            node.pn = sum(c.pn for c in children)
+            node.dn = min(c.dn for c in children)
+            if node.pn == 0:
+                node.dist = 1 + max(c.dist for c in children)
@@ -0,0 +1,92 @@
+"""
+Fixed-size cache of the evaluations of the positions.
+
+The same leaves are scored again and again: through transpositions, in
+sibling subtrees and in the searches of the following turns. EvalCache maps
+the Zobrist hash of a position and the player it is evaluated for to the
+value of Tablut.compute_utility, in preallocated NumPy arrays sized from a
+memory cap, so it can be kept for a whole game. It is direct-mapped: a new
+entry always replaces the one in its slot.
+
+It also measures how long the evaluations it computes take, to estimate the
+time its hits save.
+"""
+import numpy as np
+
+# position hashing
+from zobrist import PLAYER_KEY
+
+# keys + values
+ENTRY_BYTES = 8 + 8
+
+
+class EvalCache:
+    def __init__(self, max_mb=16):
+        """
+        Allocates the cache.
+
+        Args:
+            max_mb (float): The memory cap of the cache in megabytes.
+        """
+        # Power of two slots so that the index is a mask of the key
+        size = max(1, int(max_mb * 2**20) // ENTRY_BYTES)
+        self.size = 1 << (size.bit_length() - 1)
+        self.mask = self.size - 1
+
+        # A zero key marks an empty slot
+        self.keys = np.zeros(self.size, dtype=np.uint64)
+        self.values = np.zeros(self.size, dtype=np.float64)
+
+        self.new_move()
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.values.nbytes
+
+    def new_move(self):
+        """
+        Resets the counters, which are reported per move: the entries are kept.
+        """
+        self.hits = self.misses = 0
+        # Time spent computing the evaluations that were missing
+        self.eval_time = 0.0
+
+    def clear(self):
+        self.keys[:] = 0
+
+    @staticmethod
+    def key(h, player):
+        """Returns the key of the position with hash h evaluated for player."""
+        return h ^ PLAYER_KEY if player == 'BLACK' else h
+
+    def probe(self, key):
+        """
+        Returns the cached value of key, or None.
+        """
+        slot = key & self.mask
+        if int(self.keys[slot]) == key:
+            self.hits += 1
+            return float(self.values[slot])
+        self.misses += 1
+        return None
+
+    def store(self, key, value, elapsed=0.0):
+        """
+        Stores the value of key, computed in elapsed seconds.
+        """
+        slot = key & self.mask
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.eval_time += elapsed
+
+    def stats(self):
+        """
+        Returns the counters since the last new_move: hits, misses, hit rate
+        and the time saved, estimated as the hits times the mean time of the
+        evaluations that had to be computed.
+        """
+        lookups = self.hits + self.misses
+        cost = self.eval_time / self.misses if self.misses else 0.0
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'eval_time': self.eval_time, 'time_saved': self.hits * cost}
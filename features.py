@@ -0,0 +1,156 @@
+"""
+Evaluation features maintained incrementally by the board.
+
+white_fitness and black_fitness are weighted sums of a few features of the
+position: the pawn counts, the distance of the king from the throne and its
+position weight, the black pawns with a free path to the king and the black
+pawns next to it. A move changes few of them, so Board.make_move updates the
+tuple of FEATURES of the position instead of the heuristics recomputing them
+at every leaf:
+
+- a capture changes the counts;
+- the features of the king are looked up again when the king moves;
+- the free paths are recounted only when a piece leaves or enters the row or
+  the column of the king, and the blacks next to it only when that happens
+  around the king.
+
+The previous tuple is kept in the undo record, so unmake_move restores it as
+it is. Tablut.compute_utility is then the dot product of the features with
+the weight vector of the player (feature_weights).
+"""
+from operator import mul
+
+# move generation
+from bitboard import (NUM_SQUARES, SQUARES, SQUARE_BB, THRONE_BB, NEIGHBOURS_BB, AROUND_BB, RAYS,
+                      square, count, in_sight)
+
+# board geometry
+from geometry import DISTANCE_FROM_CENTER, POSITION_WEIGHTS
+
+# utils
+from utils import Pawn
+
+# In the order the heuristics add them up, so that the dot product gives
+# exactly the same floats
+FEATURES = ('num_blacks', 'num_whites', 'king_distance', 'blacks_around',
+            'free_paths', 'blacks_orthogonal', 'position_weight')
+
+# KING_LINES_BB[sq]: bitboard of the row and the column of sq, sq excluded
+KING_LINES_BB = tuple(RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq]
+                      for sq in range(NUM_SQUARES))
+# KING_ZONE_BB[sq]: the squares where a piece changes the features of a king on sq
+KING_ZONE_BB = tuple(KING_LINES_BB[sq] | AROUND_BB[1][sq] for sq in range(NUM_SQUARES))
+
+# The features of a board without a king, which has been lost anyway
+NO_KING = (0, 0, 0, 0, 0)
+
+KING = Pawn.KING.value
+
+
+def king_features(sq, black_bb, occupied):
+    """
+    Returns the features that depend on the square of the king: its
+    distance from the throne, the blacks next to it (diagonals included),
+    the free paths, the blacks next to it orthogonally and its position
+    weight.
+
+    Args:
+        sq (int): The square of the king.
+        black_bb (int): Bitboard of the black pawns.
+        occupied (int): Bitboard of every piece, the throne included.
+    """
+    row, col = SQUARES[sq]
+    return (DISTANCE_FROM_CENTER[sq],
+            count(AROUND_BB[1][sq] & black_bb),
+            count(in_sight(sq, occupied) & black_bb),
+            count(NEIGHBOURS_BB[sq] & black_bb),
+            POSITION_WEIGHTS[row][col])
+
+
+def compute_features(board):
+    """
+    Returns the FEATURES of board, computed from scratch.
+    """
+    if board.king is None:
+        king = NO_KING
+    else:
+        king = king_features(square(*board.king), board.black_bb, board.occupied)
+    return (len(board.blacks), len(board.whites)) + king
+
+
+def _king_zone(features, sq, changed, black_bb, occupied):
+    # The features of a king on sq after the pieces on changed have moved
+    if not changed & KING_ZONE_BB[sq]:
+        # Nothing the features look at has changed
+        return features
+    num_blacks, num_whites, distance, around, free_paths, orthogonal, weight = features
+    if changed & KING_LINES_BB[sq]:
+        free_paths = count(in_sight(sq, occupied) & black_bb)
+    if changed & AROUND_BB[1][sq]:
+        orthogonal = count(NEIGHBOURS_BB[sq] & black_bb)
+        around = count(AROUND_BB[1][sq] & black_bb)
+    return num_blacks, num_whites, distance, around, free_paths, orthogonal, weight
+
+
+def update_features(features, board, move, piece, captured):
+    """
+    Returns the FEATURES of board after move, given the features before it.
+
+    Args:
+        features (tuple): The features of the position before the move.
+        board (Board): The position after the move, captures included.
+        move (tuple): The move played.
+        piece (int): The Pawn value of the piece moved.
+        captured (list): The (position, value) of the pieces captured.
+    """
+    king_bb = board.king_bb
+    if not king_bb:
+        return (len(board.blacks), len(board.whites)) + NO_KING
+    sq = king_bb.bit_length() - 1
+    if captured:
+        features = (len(board.blacks), len(board.whites)) + features[2:]
+    if piece == KING:
+        return features[:2] + king_features(sq, board.black_bb, board.occupied)
+
+    (fx, fy), (tx, ty) = move
+    changed = SQUARE_BB[fx * 9 + fy] | SQUARE_BB[tx * 9 + ty]
+    for (x, y), _ in captured:
+        changed |= SQUARE_BB[x * 9 + y]
+    return _king_zone(features, sq, changed, board.black_bb, board.occupied)
+
+
+def child_features(features, board, move):
+    """
+    Returns the FEATURES of the position move leads to from board, given
+    the features of board, without playing it. move must capture nothing.
+    """
+    (fx, fy), (tx, ty) = move
+    from_bb, to_bb = SQUARE_BB[fx * 9 + fy], SQUARE_BB[tx * 9 + ty]
+    black_bb, king_bb = board.black_bb, board.king_bb
+    occupied = ((board.white_bb | black_bb | king_bb) ^ from_bb ^ to_bb) | THRONE_BB
+    if king_bb & from_bb:
+        return features[:2] + king_features(to_bb.bit_length() - 1, black_bb, occupied)
+    if not king_bb:
+        return features
+    if black_bb & from_bb:
+        black_bb ^= from_bb | to_bb
+    return _king_zone(features, king_bb.bit_length() - 1, from_bb | to_bb, black_bb, occupied)
+
+
+def feature_weights(player, weights):
+    """
+    Returns the weight of every feature in the fitness of player, where
+    weights are the ones of white_fitness or black_fitness.
+    """
+    if player == 'WHITE':
+        alpha0, beta0, gamma0, theta0, epsilon0, omega0 = weights
+        return (-alpha0, beta0, gamma0, 0, -omega0, -theta0, epsilon0)
+    alpha0, beta0, gamma0, theta0, epsilon0 = weights
+    return (alpha0, -beta0, 0, gamma0, theta0, 0, 0)
+
+
+def dot(features, weights):
+    """
+    Returns the fitness of the position of features for the feature_weights weights.
+    """
+    return sum(map(mul, features, weights))
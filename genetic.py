@@ -1,128 +1,200 @@
-from play import play_game
-import time
-import random
+import argparse
 import copy
-import sys
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+# arena
+from arena import EnginePlayer, play_match, WHITEWIN, BLACKWIN
+
+# heuristics
+from whiteheuristics import WHITE_WEIGHTS
+from blackheuristics import BLACK_WEIGHTS
 
-def cutoff_depth(d):
-    return lambda game, state, depth: depth > d
 
-def fitness(turns):
-    return 30-turns
+def fitness(turns, max_moves=30):
+    return max_moves-turns
 
-def create_starting_population(elements = 10):
+
+def create_starting_population(genes, elements=10, rng=random):
     population = []
     for i in range(elements):
-        population.append([random.uniform(0, 2), random.uniform(0, 2), random.uniform(0, 10), random.uniform(0, 2), random.uniform(0, 3)])
+        population.append([rng.uniform(0, 2) for _ in range(genes)])
     return population
 
+
 def cross_chromosome(chromosome1, chromosome2):
-    alpha0, beta0, gamma0, theta0, epsilon0 = chromosome1
-    alpha1, beta1, gamma1, theta1, epsilon1 = chromosome2
-    new_chromosome1 = [alpha0, beta1, gamma0, theta1, epsilon0]
-    new_chromosome2 = [alpha1, beta0, gamma1, theta0, epsilon1]
+    # The genes are taken alternately from the two parents
+    new_chromosome1 = [g1 if i % 2 == 0 else g2 for i,
+                       (g1, g2) in enumerate(zip(chromosome1, chromosome2))]
+    new_chromosome2 = [g2 if i % 2 == 0 else g1 for i,
+                       (g1, g2) in enumerate(zip(chromosome1, chromosome2))]
     return new_chromosome1, new_chromosome2
 
-def mate(elements):
-    random1 = copy.deepcopy(random.choice(elements))
-    random2 = copy.deepcopy(random.choice(elements))
 
-    alpha0, beta0, gamma0, theta0, epsilon0 = random1
-    alpha1, beta1, gamma1, theta1, epsilon1 = random2
+def mate(elements, rng=random):
+    random1 = copy.deepcopy(rng.choice(elements))
+    random2 = copy.deepcopy(rng.choice(elements))
 
-    new_chromosome = [(alpha0+alpha1)/2, (beta0+beta1)/2, (gamma0+gamma1)/2, (theta0+theta1)/2, (epsilon0+epsilon1)/2]
+    new_chromosome = [(g1+g2)/2 for g1, g2 in zip(random1, random2)]
     return new_chromosome
 
-def create_random_chromosome():
-    return [random.uniform(0, 5), random.uniform(0, 5), random.uniform(0, 5), random.uniform(0, 5), random.uniform(0, 5)]
 
-def mutate(population, mutation_rate=0.6):
-    print(population)
+def create_random_chromosome(genes, rng=random):
+    return [rng.uniform(0, 5) for _ in range(genes)]
+
+
+def mutate(population, mutation_rate=0.6, rng=random):
     for i in range(1, len(population)):
-        if random.random() < mutation_rate:
-            alpha, beta, gamma, theta, epsilon = population[i]
-            alpha += random.uniform(-1, 1)
-            beta += random.uniform(-1, 1)
-            gamma += random.uniform(-1, 1)
-            theta += random.uniform(-1, 1)
-            epsilon += random.uniform(-1, 1)
-            population[i] = [alpha, beta, gamma, theta, epsilon]
+        if rng.random() < mutation_rate:
+            population[i] = [g + rng.uniform(-1, 1) for g in population[i]]
     return population
 
-def create_starting_from_params(alpha, beta, gamma, theta, epsilon, elements=10):
+
+def create_starting_from_params(params, elements=10, rng=random):
     population = []
 
     for i in range(elements):
-        population.append([alpha+random.uniform(-1,1), beta+random.uniform(-1,1), gamma+random.uniform(-1,1), theta+random.uniform(-1,1), epsilon+random.uniform(-1,1)])
+        population.append([g+rng.uniform(-1, 1) for g in params])
     return population
-    
-
-iterations = 50
-elements = 10
-max_moves = 30
-cod = cutoff_depth(2)
-population = create_starting_population(elements)
-
-
-for iteration in range(iterations):
-    results = []
-    for pop in population:
-        print(pop)
-        alpha0, beta0, gamma0, theta0, epsilon0 = pop
-        result, turns = play_game(alpha0, beta0, gamma0, theta0, epsilon0, cod, max_moves, name="Player", team=sys.argv[1], server_ip="127.0.0.1", timeout=60)
-        #If result = 0, white wins
-        #If result = 1, black wins
-        #If result = 2, draw
-        #If result = 3, max moves reached
-        if result == 0:
-            results.append([pop, fitness(turns)])
-        else:
-            results.append([pop, -1])
-        time.sleep(15)
-
-    
-    results = sorted(results, key=lambda x: x[1], reverse=True)
-    print("Best fitness: ", results[0][1])
-    print("Best parameters: ", results[0][0])
-    with open("results.txt", "a") as f:
-        f.write("Generation: " + str(iteration) + "\n")
-        f.write("Best fitness: " + str(results[0][1]) + "\n")
-        f.write("Best parameters: " + str(results[0][0]) + "\n\n")
-    
-
-
-    #I copy the first element of the population
-    new_population = []
-    new_population.append(copy.deepcopy(results[0][0]))
-
-    #I cross the first element with the second and the third
-    e1, e2 = cross_chromosome(results[0][0], results[1][0])
-    new_population.append(e1)
-    new_population.append(e2)
-    e1, e2 = cross_chromosome(results[0][0], results[2][0])
-    new_population.append(e1)
-    new_population.append(e2)
-
-
-    #I mate from the top 5 elements creating the remaining-3 elements
-    top_five = copy.deepcopy(results[:5])
-    random.shuffle(top_five)
-    top_five = [x[0] for x in top_five]
-
-    new_population.append(mate(top_five))
-    new_population.append(mate(top_five))
-    new_population.append(mate(top_five))
 
-    #I add three random elements
-    new_population.append(create_random_chromosome())
-    new_population.append(create_random_chromosome())
 
-    #I mutate everything except the first element
-    new_population = mutate(new_population)
+def next_generation(results, elements, rng=random):
+    """
+    Builds the next population from the (chromosome, fitness) results sorted best first.
+    """
+    genes = len(results[0][0])
 
-    #I update the population
-    population = copy.deepcopy(new_population)
-
-    
+    # I copy the first element of the population
+    new_population = [copy.deepcopy(results[0][0])]
 
+    # I cross the first element with the second and the third
+    for other in results[1:3]:
+        new_population.extend(cross_chromosome(results[0][0], other[0]))
 
+    # I mate from the top 5 elements creating the remaining elements, but two
+    top_five = copy.deepcopy(results[:5])
+    rng.shuffle(top_five)
+    top_five = [x[0] for x in top_five]
+    while len(new_population) < elements - 2:
+        new_population.append(mate(top_five, rng))
+
+    # I add two random elements
+    while len(new_population) < elements:
+        new_population.append(create_random_chromosome(genes, rng))
+
+    # I mutate everything except the first element
+    return mutate(new_population[:elements], rng=rng)
+
+
+def play_individual(chromosome, team, seed, args):
+    """
+    Plays a local game between chromosome, playing team, and the current weights on the other side.
+
+    Returns:
+        float: fitness(turns) if team wins within max_moves moves, -1 otherwise.
+    """
+    weights = {'WHITE': WHITE_WEIGHTS, 'BLACK': BLACK_WEIGHTS}
+    weights[team] = chromosome
+    player = EnginePlayer(depth=args.depth, time_limit=args.time,
+                          white_weights=weights['WHITE'], black_weights=weights['BLACK'])
+    opponent = EnginePlayer(depth=args.depth, time_limit=args.time)
+    white, black = (player, opponent) if team == 'WHITE' else (
+        opponent, player)
+
+    result = play_match(white, black, opening_plies=args.opening_plies,
+                        seed=seed, max_plies=2 * args.max_moves)
+
+    # The moves played by team
+    turns = (result['plies'] + (team == 'WHITE')) // 2
+    if result['outcome'] == (WHITEWIN if team == 'WHITE' else BLACKWIN):
+        return fitness(turns, args.max_moves)
+    return -1
+
+
+def evaluate(population, generation, pool, args):
+    """
+    Plays args.games games for every chromosome of the population on the pool.
+
+    Returns:
+        list: The [chromosome, mean fitness] results, sorted best first.
+    """
+    futures = [[pool.submit(play_individual, chromosome, args.team,
+                            # The same openings for the whole generation
+                            args.seed + generation * args.games + game, args)
+                for game in range(args.games)] for chromosome in population]
+    results = [[chromosome, sum(f.result() for f in games) / len(games)]
+               for chromosome, games in zip(population, futures)]
+    return sorted(results, key=lambda x: x[1], reverse=True)
+
+
+def save_checkpoint(path, checkpoint):
+    # Written aside and renamed, so that an interrupted run never leaves half a file
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(checkpoint, f)
+    os.replace(path + '.tmp', path)
+
+
+def main(args):
+    if args.resume and os.path.exists(args.checkpoint):
+        with open(args.checkpoint, 'rb') as f:
+            checkpoint = pickle.load(f)
+        rng = random.Random()
+        rng.setstate(checkpoint['rng'])
+        print(
+            f"Resuming from generation {checkpoint['generation']} of {args.checkpoint}")
+    else:
+        rng = random.Random(args.seed)
+        params = WHITE_WEIGHTS if args.team == 'WHITE' else BLACK_WEIGHTS
+        checkpoint = {'generation': 0, 'results': None,
+                      'population': create_starting_from_params(params, args.elements, rng)}
+
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for iteration in range(checkpoint['generation'], args.iterations):
+            results = evaluate(checkpoint['population'], iteration, pool, args)
+
+            print("Generation: ", iteration)
+            print("Best fitness: ", results[0][1])
+            print("Best parameters: ", results[0][0])
+            with open("results.txt", "a") as f:
+                f.write("Generation: " + str(iteration) + "\n")
+                f.write("Best fitness: " + str(results[0][1]) + "\n")
+                f.write("Best parameters: " + str(results[0][0]) + "\n\n")
+
+            checkpoint = {'generation': iteration + 1, 'results': results,
+                          'population': next_generation(results, args.elements, rng)}
+            checkpoint['rng'] = rng.getstate()
+            save_checkpoint(args.checkpoint, checkpoint)
+
+
+if __name__ == "__main__":
+    argparse = argparse.ArgumentParser()
+
+    argparse.add_argument(
+        "--team", help="The side whose weights are tuned: WHITE or BLACK", type=str.upper, choices=["WHITE", "BLACK"], required=True)
+    argparse.add_argument(
+        "--iterations", help="The number of generations", type=int, default=50)
+    argparse.add_argument(
+        "--elements", help="The size of the population", type=int, default=10)
+    argparse.add_argument(
+        "--games", help="The games played by every individual of a generation", type=int, default=4)
+    argparse.add_argument(
+        "--max-moves", help="The moves of the tuned side after which a game is lost", type=int, default=30)
+    argparse.add_argument(
+        "--depth", help="The search depth of both players", type=int, default=2)
+    argparse.add_argument(
+        "--time", help="The seconds available for each move", type=float, default=10)
+    argparse.add_argument(
+        "--opening-plies", help="Random moves played at the start of every game", type=int, default=4)
+    argparse.add_argument(
+        "--workers", help="The number of games played at the same time", type=int, default=None)
+    argparse.add_argument(
+        "--seed", help="The seed of the population and of the openings", type=int, default=0)
+    argparse.add_argument(
+        "--checkpoint", help="The file the state of the run is saved to after every generation", type=str, default="genetic.pkl")
+    argparse.add_argument(
+        "--resume", help="Continue the run saved in the checkpoint", action="store_true")
+    args = argparse.parse_args()
+
+    main(args)
@@ -0,0 +1,148 @@
+"""
+Static geometry of the 9x9 Tablut board.
+
+Everything that only depends on the squares (where the throne, the camps and
+the escapes are, the neighbours of a square, the rays leaving it and the
+lines from it to the escapes, the quadrants, the position weights of the
+king) is computed here once at import time. Move generation (bitboard.py), the capture rules (board.py) and the
+evaluation (the heuristics and features.py) all read these tables instead
+of rebuilding or hard-coding them.
+
+Squares are indexed as ``row * 9 + col``. The tables are plain tuples and
+the per-square flags NumPy arrays indexed by square.
+"""
+import numpy as np
+
+SIZE = 9
+NUM_SQUARES = SIZE * SIZE
+
+# (row, col) of every square index
+SQUARES = tuple((sq // SIZE, sq % SIZE) for sq in range(NUM_SQUARES))
+
+
+def square(row, col):
+    """Return the square index of (row, col)."""
+    return row * SIZE + col
+
+
+THRONE = (4, 4)
+THRONE_SQ = square(*THRONE)
+
+# The four camps: north, west, east, south
+CAMP_GROUPS = (
+    ((0, 3), (0, 4), (0, 5), (1, 4)),
+    ((3, 0), (4, 0), (5, 0), (4, 1)),
+    ((3, 8), (4, 8), (5, 8), (4, 7)),
+    ((8, 3), (8, 4), (8, 5), (7, 4)),
+)
+CAMPS = tuple(pos for camp in CAMP_GROUPS for pos in camp)
+
+ESCAPES = (
+    (0, 1), (0, 2), (0, 6), (0, 7),
+    (1, 0), (2, 0), (6, 0), (7, 0),
+    (1, 8), (2, 8), (6, 8), (7, 8),
+    (8, 1), (8, 2), (8, 6), (8, 7),
+)
+
+# Directions as (row step, col step); NORTH and WEST walk towards lower square
+# indexes, SOUTH and EAST towards higher ones.
+NORTH, SOUTH, WEST, EAST = range(4)
+DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+STEPS = (-SIZE, SIZE, -1, 1)
+
+
+def _ray(sq, direction):
+    row, col = SQUARES[sq]
+    d_row, d_col = DIRECTIONS[direction]
+    squares = []
+    row, col = row + d_row, col + d_col
+    while 0 <= row < SIZE and 0 <= col < SIZE:
+        squares.append(square(row, col))
+        row, col = row + d_row, col + d_col
+    return squares
+
+
+# RAY_SQUARES[direction][sq]: the squares met leaving sq in that direction,
+# nearest first
+RAY_SQUARES = tuple(
+    tuple(tuple(_ray(sq, direction)) for sq in range(NUM_SQUARES))
+    for direction in range(4)
+)
+
+
+def _escape_ray(ray):
+    for i, sq in enumerate(ray):
+        if SQUARES[sq] in ESCAPES:
+            return ray[:i + 1]
+    return ()
+
+
+# ESCAPE_RAYS[sq]: the squares leaving sq up to the first escape square,
+# nearest first, in the directions where there is one
+ESCAPE_RAYS = tuple(
+    tuple(line for line in (_escape_ray(RAY_SQUARES[d][sq]) for d in range(4)) if line)
+    for sq in range(NUM_SQUARES)
+)
+
+# NEIGHBOURS[sq]: (next square, square beyond it or None) in every
+# direction where sq is not on the edge of the board
+NEIGHBOURS = tuple(
+    tuple((ray[0], ray[1] if len(ray) > 1 else None)
+          for ray in (RAY_SQUARES[d][sq] for d in range(4)) if ray)
+    for sq in range(NUM_SQUARES)
+)
+
+
+def _around(sq, distance):
+    row, col = SQUARES[sq]
+    return tuple(square(row + i, col + j)
+                 for i in range(-distance, distance + 1)
+                 for j in range(-distance, distance + 1)
+                 if (i, j) != (0, 0) and 0 <= row + i < SIZE and 0 <= col + j < SIZE)
+
+
+# AROUND[distance][sq]: the squares within distance of sq, diagonals
+# included (sq excluded), for distance 1 and 2
+AROUND = (None,) + tuple(
+    tuple(_around(sq, distance) for sq in range(NUM_SQUARES))
+    for distance in (1, 2)
+)
+
+# Per-square flags
+CAMP_ID = np.full(NUM_SQUARES, -1, dtype=np.int8)
+for _id, _camp in enumerate(CAMP_GROUPS):
+    CAMP_ID[[square(*pos) for pos in _camp]] = _id
+IS_CAMP = CAMP_ID >= 0
+IS_THRONE = np.zeros(NUM_SQUARES, dtype=bool)
+IS_THRONE[THRONE_SQ] = True
+IS_ESCAPE = np.zeros(NUM_SQUARES, dtype=bool)
+IS_ESCAPE[[square(*pos) for pos in ESCAPES]] = True
+NEXT_TO_THRONE = np.zeros(NUM_SQUARES, dtype=bool)
+NEXT_TO_THRONE[[near for near, _ in NEIGHBOURS[THRONE_SQ]]] = True
+
+# QUADRANTS[n]: the 4x4 corners of the board, 0 = top left, 1 = top right,
+# 2 = bottom left, 3 = bottom right (the middle row and column are in none)
+QUADRANTS = tuple(
+    tuple(square(row, col) for row in rows for col in cols)
+    for rows in (range(4), range(5, 9)) for cols in (range(4), range(5, 9))
+)
+QUADRANT_ARRAY = np.zeros((4, NUM_SQUARES), dtype=bool)
+for _n, _squares in enumerate(QUADRANTS):
+    QUADRANT_ARRAY[_n, list(_squares)] = True
+
+# How good every square is for the king, from the point of view of WHITE
+POSITION_WEIGHTS = (
+    (0, 20, 20, -6, -6, -6, 20, 20, 0),
+    (20, 1, 1, -5, -6, -5, 1, 1, 20),
+    (20, 1, 4, 1, -2, 1, 4, 1, 20),
+    (-6, -5, 1, 1, 1, 1, 1, -5, -6),
+    (-6, -6, -2, 1, 2, 1, -2, -6, -6),
+    (-6, -5, 1, 1, 1, 1, 1, -5, -6),
+    (20, 1, 4, 1, -2, 1, 4, 1, 20),
+    (20, 1, 1, -5, -6, -5, 1, 1, 20),
+    (0, 20, 20, -6, -6, -6, 20, 20, 0),
+)
+
+# Euclidean distance of every square from the throne
+DISTANCE_FROM_CENTER = tuple(((row - THRONE[0])**2 + (col - THRONE[1])**2)**0.5
+                             for row, col in SQUARES)
@@ -0,0 +1,162 @@
+"""
+Move ordering for the alpha-beta search.
+
+Alpha-beta prunes the most when the best move of every node is searched
+first. MoveOrderer sorts the moves of a node by how likely they are to be
+that move:
+
+1. the move stored in the transposition table for the position;
+2. the moves that capture (the more pieces, the better) and the king moves
+   onto an escape square or onto a line that leads to one;
+3. the killer moves of the ply: quiet moves that caused a cutoff in a
+   sibling node;
+4. the rest by their history score, which grows every time the move causes
+   a cutoff, the more so the deeper the node.
+
+It also counts how often the cutoffs happen on the first move searched,
+which is how good the ordering is.
+"""
+# move generation
+import bitboard
+
+# utils
+from utils import Pawn
+
+TT_SCORE = 1 << 40
+WIN_SCORE = 1 << 36
+CAPTURE_SCORE = 1 << 32
+OPEN_ESCAPE_SCORE = 1 << 31
+KILLER_SCORE = 1 << 30
+
+# Killer moves kept for each ply
+KILLERS = 2
+
+
+def move_index(move):
+    (from_pos, to_pos) = move
+    return bitboard.square(*from_pos) * bitboard.NUM_SQUARES + bitboard.square(*to_pos)
+
+
+class MoveOrderer:
+    def __init__(self, max_ply=64):
+        """
+        Creates empty killer and history tables.
+
+        Args:
+            max_ply (int): The deepest ply killer moves are kept for.
+        """
+        self.killers = [[None] * KILLERS for _ in range(max_ply)]
+        self.history = [0] * bitboard.NUM_SQUARES ** 2
+        self.reset_stats()
+
+    def reset_stats(self):
+        # Nodes whose moves have been searched, nodes cut and cut on the first move
+        self.nodes = self.cutoffs = self.first_move_cutoffs = 0
+        self.moves_searched = 0
+
+    def new_search(self):
+        """
+        Called before every search: the killers of a previous position are
+        forgotten and the history scores fade, so that recent cutoffs weigh more.
+        """
+        for killers in self.killers:
+            killers[:] = [None] * KILLERS
+        self.history = [h >> 1 for h in self.history]
+        self.reset_stats()
+
+    def score(self, board, move, ply, targets=None):
+        """
+        Returns the ordering score of a move that is not the transposition table move.
+
+        targets is the bitboard of the squares next to an opponent piece, where
+        a move has to land to capture (all the squares when None).
+        """
+        (from_pos, to_pos) = move
+        score = self.history[move_index(move)]
+        if move in self.killers[ply]:
+            score += KILLER_SCORE >> self.killers[ply].index(move)
+
+        to_bit = bitboard.SQUARE_BB[bitboard.square(*to_pos)]
+        captured = board.captures(move) if targets is None or to_bit & targets else None
+        if captured:
+            score += CAPTURE_SCORE * len(captured)
+            if any(value == Pawn.KING.value for _, value in captured):
+                score += WIN_SCORE
+
+        if from_pos == board.king:
+            to_sq = bitboard.square(*to_pos)
+            if bitboard.SQUARE_BB[to_sq] & bitboard.ESCAPES_BB:
+                score += WIN_SCORE
+            elif bitboard.open_escapes(
+                    to_sq, board.occupied & ~bitboard.SQUARE_BB[bitboard.square(*from_pos)]):
+                score += OPEN_ESCAPE_SCORE
+        return score
+
+    def order(self, board, moves, tt_move, ply):
+        """
+        Returns the moves sorted best first.
+
+        Args:
+            board: The Board the moves are played on.
+            moves: The legal moves of board.
+            tt_move: The transposition table move of the position, or None.
+            ply (int): The distance of the node from the root.
+        """
+        if board.to_move == 'WHITE':
+            opponents = board.black_bb
+        else:
+            opponents = board.white_bb | board.king_bb
+        targets = 0
+        for sq in bitboard.iter_squares(opponents):
+            targets |= bitboard.NEIGHBOURS_BB[sq]
+
+        scores = {move: self.score(board, move, ply, targets) for move in moves}
+        if tt_move in scores:
+            scores[tt_move] += TT_SCORE
+        return sorted(scores, key=scores.get, reverse=True)
+
+    def searched(self, index, cut):
+        """
+        Records the end of the move loop of a node.
+
+        Args:
+            index (int): The position of the last move searched in the ordered moves.
+            cut (bool): Whether the node ended with a cutoff.
+        """
+        self.nodes += 1
+        self.moves_searched += index + 1
+        if cut:
+            self.cutoffs += 1
+            if index == 0:
+                self.first_move_cutoffs += 1
+
+    def cutoff(self, move, ply, depth, capture):
+        """
+        Rewards the move that caused a cutoff.
+
+        Args:
+            move: The move.
+            ply (int): The distance of the node from the root.
+            depth (int): The remaining depth of the node.
+            capture (bool): Whether the move captured, captures are not killers.
+        """
+        if capture:
+            return
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1:] = killers[:-1]
+            killers[0] = move
+        self.history[move_index(move)] += depth * depth
+
+    def stats(self):
+        """
+        Returns the ordering statistics since the last new_search: the
+        fraction of the cutoffs happening on the first move and the average
+        number of moves searched per node.
+        """
+        return {
+            'nodes': self.nodes,
+            'cutoffs': self.cutoffs,
+            'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+            'moves_per_node': self.moves_searched / self.nodes if self.nodes else 0.0,
+        }
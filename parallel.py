@@ -0,0 +1,158 @@
+"""
+Root-parallel alpha-beta search.
+
+The root moves are dealt round-robin to the processes of a pool, each one
+searching its share with alphabeta and its own transposition table. The
+best root value found so far is kept in shared memory: every worker raises
+its alpha to it after each root move and publishes its own improvements, so
+the moves searched late are cut by the bounds found by the other workers.
+"""
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# numpy
+import numpy as np
+
+# utils
+from utils import WinException
+
+# Per-process state of the pool workers, set by _init_worker
+_game = None
+_tt = None
+_shared_alpha = None
+
+
+def _init_worker(shared_alpha, tt_size):
+    global _game, _tt, _shared_alpha
+    # play imports this module, so its names are only resolved in the workers
+    from tablut import Tablut
+    from transposition import TranspositionTable
+
+    _game = Tablut()
+    _tt = TranspositionTable(max_mb=tt_size)
+    _shared_alpha = shared_alpha
+
+
+def _search_root(pieces, to_move, root_moves, depth, deadline):
+    """
+    Searches root_moves depth plies deep in a worker.
+
+    Returns:
+        dict: The outcome of the search: 'scores', 'value', 'move', 'nodes',
+        'complete' (False on timeout) and 'win' (the winning move, if any).
+    """
+    from play import alphabeta, cutoff_depth
+
+    _game.update_state(pieces, to_move)
+    board = _game.initial.copy()
+    _tt.new_search()
+
+    try:
+        value, move, scores, nodes = alphabeta(
+            board, _game, cutoff_depth(depth - 1), deadline, _tt, root_moves,
+            shared_alpha=_shared_alpha)
+    except TimeoutError:
+        return {'complete': False, 'win': None}
+    except WinException as e:
+        return {'complete': True, 'win': e.args[0]}
+    return {'complete': True, 'win': None, 'value': value, 'move': move,
+            'scores': scores, 'nodes': nodes}
+
+
+class ParallelSearcher:
+    def __init__(self, workers, tt_size=64):
+        """
+        Starts the pool of worker processes.
+
+        Args:
+            workers (int): The number of worker processes.
+            tt_size (float): The memory cap in MB of the transposition table of each worker.
+        """
+        self.workers = workers
+        self.shared_alpha = multiprocessing.Value('d', -np.inf)
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker,
+            initargs=(self.shared_alpha, tt_size))
+
+    def shutdown(self):
+        self.pool.shutdown(cancel_futures=True)
+
+    def search_depth(self, board, depth, deadline, root_moves):
+        """
+        Searches the root moves of board depth plies deep across the pool.
+
+        Returns:
+            dict: The merged outcome, with the same keys as _search_root.
+        """
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = -np.inf
+
+        # Round-robin: every worker starts from one of the best moves
+        chunks = [root_moves[i::self.workers] for i in range(self.workers)]
+        futures = [self.pool.submit(_search_root, board.pieces, board.to_move, chunk, depth, deadline)
+                   for chunk in chunks if chunk]
+        results = [future.result() for future in futures]
+
+        merged = {'complete': all(r['complete'] for r in results), 'win': None,
+                  'value': -np.inf, 'move': None, 'scores': {}, 'nodes': 0}
+        for r in results:
+            if r['win'] is not None:
+                merged['win'] = r['win']
+            if not r['complete'] or r['win'] is not None:
+                continue
+            merged['scores'].update(r['scores'])
+            merged['nodes'] += r['nodes']
+            if r['value'] > merged['value']:
+                merged['value'], merged['move'] = r['value'], r['move']
+        return merged
+
+    def search(self, state, time_limit=55, max_depth=64):
+        """
+        Iterative deepening over the pool, with the same time management as
+        play.iterative_deepening_search: each depth is searched in parallel,
+        the root moves are reordered by the scores of the last completed depth
+        and a new depth starts only if it is predicted to fit in the time left.
+
+        Args:
+            state: The Board to search.
+            time_limit: The maximum time limit for the search.
+            max_depth: The deepest iteration to run.
+
+        Returns:
+            The best move to be played from the current state.
+        """
+        start_time = time.time()
+        deadline = start_time + time_limit
+
+        root_moves = sorted(state.legal_moves())
+        if not root_moves:
+            return None
+
+        best_move = root_moves[0]
+        last_nodes = None
+        for depth in range(1, max_depth + 1):
+            iteration_start = time.time()
+            result = self.search_depth(state, depth, deadline, root_moves)
+            if result['win'] is not None:
+                return result['win']
+            if not result['complete']:
+                break
+
+            iteration_time = time.time() - iteration_start
+            best_move = result['move']
+            scores = result['scores']
+            root_moves = sorted(scores, key=scores.get, reverse=True)
+            print(f"DEPTH {depth}: {best_move} {result['value']:.3f} "
+                  f"({result['nodes']} nodes, {iteration_time:.2f}s, {self.workers} workers)")
+
+            if abs(result['value']) >= 1e10:
+                break
+
+            nodes = result['nodes']
+            branching = nodes / last_nodes if last_nodes else len(root_moves)
+            last_nodes = nodes
+            if iteration_time * max(branching, 1) > deadline - time.time():
+                break
+
+        return best_move
@@ -1,6 +1,7 @@
 import argparse
+import os
 import time
-import copy
+from itertools import count
 
 # numpy
 import numpy as np
@@ -10,32 +11,47 @@ import threading
 
 # Tablut Class
 from tablut import Tablut
-from board import Board
 
-# utils
-from utils import Network, WinException
+# transposition table
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
 
-from whiteheuristics import king_surrounded
+# parallel search
+from parallel import ParallelSearcher
 
+# move ordering
+from ordering import MoveOrderer
 
-def cache(function):
-    """
-    A decorator that caches the result of a function based on its arguments.
+# memoization
+from cache import LRUCache
+from evalcache import EvalCache
 
-    Args:
-        function: The function to be cached.
+# opening book
+from book import OpeningBook
 
-    Returns:
-        The wrapped function that caches the result.
-    """
-    cache = {}
+# endgame
+from endgame import EndgameSolver
+
+# pondering
+from ponder import Ponderer
+
+# instrumentation
+from searchstats import SearchStats
+
+# quiescence search
+from quiescence import capture_moves, escape_lines, escape_threats, evasions, line_openers, noisy_moves
+from bitboard import SQUARE_BB, square
+
+# utils
+from utils import Network, WinException
 
-    def wrapped(x, *args, **kwargs):
-        pieces = x.pieces.data.tobytes()
-        if pieces not in cache:
-            cache[pieces] = function(x, *args, **kwargs)
-        return cache[pieces]
-    return wrapped
+# Half width of the aspiration window around the value of the previous
+# iteration, in evaluation units; it is widened fourfold on every failure
+ASPIRATION_WINDOW = 2.0
+
+# Nodes the quiescence search of a leaf can visit, and the plies it can go
+# past the horizon
+QUIESCENCE_NODES = 16
+QUIESCENCE_PLIES = 6
 
 
 def cutoff_depth(d):
@@ -51,105 +67,421 @@ def cutoff_depth(d):
     return lambda game, state, depth: depth > d
 
 
-def h_alphabeta_search(state, game, cutoff, time_limit=55):
+def alphabeta(board, game, cutoff, deadline, tt, root_moves=None, shared_alpha=None, batch=True, orderer=None,
+              move_cache=None, stop=None, search_stats=None, window=(-np.inf, np.inf), pvs=True,
+              quiescence=QUIESCENCE_NODES):
     """
-    Performs a heuristic alpha-beta search to find the best move for a given game state.
+    Alpha-beta search of board, moved on in place with make/unmake.
+
+    With pvs (principal variation search) only the first move of a node is
+    searched with the full window: the others are searched with a null
+    window, which only tells whether they are better than the best move so
+    far, and searched again with the full window when they are. With a good
+    move ordering most of them are not, and a null window search prunes much
+    more than a full one.
+
+    With quiescence, the leaves are not evaluated as they are: the captures
+    and the king escape threats are searched past the horizon until the
+    position is quiet (see the quiescence module). The player to move can
+    always stand pat, keeping the static evaluation, unless the king has an
+    open line to an escape square. At the frontier only the noisy children
+    are searched this way, the others keep their batched evaluation.
 
     Args:
-        state: The current game state.
+        board: The Board to search, it is restored before returning.
         game: The game object representing the rules of the game.
         cutoff: The cutoff function that determines when to stop the search.
-        time_limit: The maximum time limit for the search.
+        deadline: The time.time() after which the search gives up.
+        tt: The TranspositionTable to probe and fill.
+        root_moves: The root moves in the order they should be searched.
+            Defaults to the legal moves, best transposition table move first.
+        shared_alpha: A multiprocessing.Value holding the best root value
+            found by the other workers of a parallel search: the root alpha
+            is synchronised with it after each root move.
+        batch: Evaluate the children of the nodes right above the cutoff
+            all at once with game.child_utilities, from the features of
+            their parent.
+        orderer: The MoveOrderer sorting the moves of every node, a new one if None.
+        move_cache: An LRUCache of the legal moves of the positions, by hash.
+        stop: A threading.Event that ends the search like the deadline when set.
+        search_stats: A SearchStats counting the nodes and leaves and timing
+            the move generation, the moves and the evaluations.
+        window: The (alpha, beta) window of the root. With a narrower one
+            than the default, a value <= alpha is only an upper bound of the
+            root value and a value >= beta a lower bound.
+        pvs: Search the moves after the first with a null window. The
+            values of the other root moves are then bounds as well.
+        quiescence: The nodes the quiescence search of a leaf can visit,
+            0 evaluates the leaves as they are.
 
     Returns:
-        The best move to be played from the current state.
+        tuple: (value, best move, {root move: value}, nodes searched)
+
+    Raises:
+        TimeoutError: When the deadline is reached or stop is set, with the best root move so far.
+        WinException: When a root move wins on the spot, with that move.
     """
-    player = state.to_move
+    player = board.to_move
     backtrack_dict = dict()
+    nodes = 0
+    if orderer is None:
+        orderer = MoveOrderer()
+
+    # Move generation, moves and evaluation, timed only when stats are collected
+    evaluate, child_utilities = game.compute_utility, game.child_utilities
+    make_move, unmake_move = type(board).make_move, type(board).unmake_move
+    if search_stats is not None:
+        evaluate = search_stats.timed('evaluation', evaluate, lambda *args: 1)
+        child_utilities = search_stats.timed('evaluation', child_utilities, lambda board, moves, *args: len(moves))
+        make_move = search_stats.timed('result', make_move)
+        unmake_move = search_stats.timed('result', unmake_move)
+
+    # Depth at which the cutoff kicks in: the remaining depth of a node is
+    # horizon - depth, which is what the table entries are compared on
+    horizon = next(d for d in count() if cutoff(game, board, d))
+
+    def probe(state, alpha, beta, depth):
+        """
+        Returns (value, tt_move, alpha, beta): value is not None when the
+        stored entry is deep enough to answer for the node on its own.
+        """
+        entry = tt.probe(state.hash)
+        if entry is None:
+            return None, None, alpha, beta
+        tt_depth, flag, tt_value, tt_move = entry
+        if depth > 0 and tt_depth >= horizon - depth:
+            if flag == EXACT:
+                return tt_value, tt_move, alpha, beta
+            elif flag == LOWER:
+                alpha = max(alpha, tt_value)
+            elif flag == UPPER:
+                beta = min(beta, tt_value)
+            if alpha >= beta:
+                return tt_value, tt_move, alpha, beta
+        return None, tt_move, alpha, beta
+
+    def store(state, alpha, beta, depth, v, move):
+        if v <= alpha:
+            flag = UPPER
+        elif v >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        tt.store(state.hash, horizon - depth, flag, v, move)
+
+    def frontier(state, alpha, beta, depth, maximize):
+        """
+        Scores all the children of a node whose children are leaves from
+        the features of the node and returns the best one.
+        """
+        nonlocal nodes
+        moves = list(legal_moves(state))
+        nodes += len(moves)
+
+        if not moves:
+            v, move = (-np.inf if maximize else +np.inf), None
+        else:
+            captures = set(capture_moves(state))
+            scores = child_utilities(state, moves, player, captures)
+            if quiescence:
+                scores = settle(state, moves, scores, alpha, beta, maximize, captures)
+            i = int(np.argmax(scores) if maximize else np.argmin(scores))
+            v, move = float(scores[i]), moves[i]
+        store(state, alpha, beta, depth, v, move)
+        return v, move
 
-    @cache
-    def max_value(state, alpha, beta, depth, action_backtrack=None):
-        nonlocal backtrack_dict
+    # The value of a king escape for player
+    escaped = +1e10 if player == 'WHITE' else -1e10
+
+    def settle(state, moves, scores, alpha, beta, maximize, captures):
+        """
+        Replaces the scores of the noisy children of a frontier node with
+        their quiescence values, searched within the bound set by the best
+        quiet child. The children left unsearched after a cutoff are scored
+        as the worst possible moves.
+        """
+        scores = list(scores)
+        lines = escape_lines(state)
+        if lines and state.to_move == 'BLACK':
+            # Only the evasions keep the king from escaping
+            noisy, openers, opened = set(evasions(state, lines)), 0, 0
+        else:
+            noisy = captures
+            if state.to_move == 'WHITE':
+                noisy = captures | set(escape_threats(state))
+            openers, opened = line_openers(state)
+        pending = []
+        for i, move in enumerate(moves):
+            if move in noisy or (SQUARE_BB[square(*move[0])] & openers
+                                 and not SQUARE_BB[square(*move[1])] & opened):
+                pending.append(i)
+            elif lines and state.to_move == 'BLACK':
+                scores[i] = escaped
+            elif maximize:
+                alpha = max(alpha, scores[i])
+            else:
+                beta = min(beta, scores[i])
+
+        # The most promising first, for the earliest cutoff
+        pending.sort(key=scores.__getitem__, reverse=maximize)
+        worst = -np.inf if maximize else +np.inf
+        for i in pending:
+            if alpha >= beta:
+                scores[i] = worst
+                continue
+            undo = make_move(state, moves[i])
+            scores[i] = v = quiesce(state, alpha, beta, scores[i])
+            unmake_move(state, undo)
+            if maximize:
+                alpha = max(alpha, v)
+            else:
+                beta = min(beta, v)
+        return scores
+
+    q_nodes = 0
+
+    def quiesce(state, alpha, beta, stand_pat=None):
+        """
+        Returns the value of a leaf once its captures and escape threats are
+        played out, within the node budget of a leaf.
+        """
+        nonlocal q_nodes
+        q_nodes = quiescence
+        return q_search(state, alpha, beta, 0, stand_pat)
+
+    def q_search(state, alpha, beta, ply, stand_pat=None):
+        nonlocal nodes, q_nodes
         if game.terminal_test(state, player):
-            return game.utility(state, player), None
-        if cutoff(game, state, depth):
-            return game.compute_utility(
-                state, player), None
-        if time.time() - start_time > time_limit:
-            best_action = max(backtrack_dict, key=backtrack_dict.get)
+            return evaluate(state, player)
+        lines = escape_lines(state)
+        if lines and state.to_move == 'WHITE':
+            return escaped
+        maximize = state.to_move == player
+        if lines and ply < QUIESCENCE_PLIES:
+            # BLACK cannot stand pat: it has to block the lines or capture the king
+            moves = evasions(state, lines)
+            if not moves:
+                return escaped
+            v = None
+        else:
+            if stand_pat is None:
+                stand_pat = evaluate(state, player)
+            if ply >= QUIESCENCE_PLIES:
+                return stand_pat
+            # Standing pat is good enough already
+            if maximize:
+                if stand_pat >= beta:
+                    return stand_pat
+                alpha = max(alpha, stand_pat)
+            else:
+                if stand_pat <= alpha:
+                    return stand_pat
+                beta = min(beta, stand_pat)
+            moves = noisy_moves(state)
+            v = stand_pat
+
+        for move in moves:
+            if q_nodes <= 0:
+                break
+            q_nodes -= 1
+            nodes += 1
+            undo = make_move(state, move)
+            v2 = q_search(state, alpha, beta, ply + 1)
+            unmake_move(state, undo)
+            if maximize:
+                if v is None or v2 > v:
+                    v = v2
+                if v >= beta:
+                    break
+                alpha = max(alpha, v)
+            else:
+                if v is None or v2 < v:
+                    v = v2
+                if v <= alpha:
+                    break
+                beta = min(beta, v)
+        if v is None:
+            # Out of budget before any evasion was searched
+            return evaluate(state, player) if stand_pat is None else stand_pat
+        return v
+
+    def legal_moves(state):
+        if move_cache is None:
+            return state.legal_moves()
+        moves = move_cache.get(state.hash)
+        if moves is None:
+            moves = frozenset(state.legal_moves())
+            move_cache.put(state.hash, moves)
+        return moves
+
+    if search_stats is not None:
+        legal_moves = search_stats.timed('actions', legal_moves)
+
+    def check_time():
+        if time.time() > deadline or (stop is not None and stop.is_set()):
+            best_action = max(backtrack_dict, key=backtrack_dict.get,
+                              default=None)
             print("TIMEOUT: ", best_action)
             raise TimeoutError(best_action)
+
+    def max_value(state, alpha, beta, depth, action_backtrack=None):
+        nonlocal backtrack_dict, nodes
+        nodes += 1
+        if game.terminal_test(state, player):
+            return evaluate(state, player), None
+        if cutoff(game, state, depth):
+            if quiescence:
+                return quiesce(state, alpha, beta), None
+            return evaluate(state, player), None
+        check_time()
+        alpha0, beta0 = alpha, beta
+        value, tt_move, alpha, beta = probe(state, alpha, beta, depth)
+        if value is not None:
+            return value, tt_move
+        if batch and depth > 0 and horizon - depth == 1:
+            return frontier(state, alpha0, beta0, depth, maximize=True)
         v, move = -np.inf, None
-        if isinstance(state, Tablut):
-            pieces = copy.deepcopy(state.initial.pieces)
-            board = state.initial.board
-        elif isinstance(state, Board):
-            pieces = copy.deepcopy(state.pieces)
-            board = state.board
-        for a in game.actions(pieces, player, board):
+        if depth == 0 and root_moves is not None:
+            moves = root_moves
+        else:
+            moves = orderer.order(state, legal_moves(state), tt_move, depth)
+        i = -1
+        for i, a in enumerate(moves):
             if depth == 0:
-                from_pos, to_pos = a
-                if from_pos == state.get_king() and to_pos in state.winning_positions:
-                    print("WINNING POSITION 1")
+                # A root move that ends the game is played without searching
+                undo = make_move(state, a)
+                won = game.check_win(state, player)
+                unmake_move(state, undo)
+                if won:
+                    print("WINNING POSITION")
                     raise WinException(a)
-                if from_pos in state.blacks:
-                    king_pos = state.get_king()
-                    coef, blocked_pos = king_surrounded(state)
-                    if king_pos == (4, 4) and coef == 3 and to_pos in [(3, 4), (5, 4), (4, 3), (4, 5)]:
-                        print("WINNING POSITION 2")
-                        raise WinException(a)
-                    elif king_pos != (4, 4) and coef > 0:
-                        new_state = game.result(state, a)
-                        _, new_blocked_pos = king_surrounded(new_state)
-                        # Check if there are two pawns in new_blocked_pos which have same row or same column
-                        if any(p1[0] == p2[0] or p1[1] == p2[1] and p1 != p2 for p1 in new_blocked_pos for p2 in new_blocked_pos):
-                            print("WINNING POSITION 3")
-                        raise WinException(a)
 
                 action_backtrack = a
-                backtrack_dict[a] = 0
-            v2, _ = min_value(game.result(state, a), alpha,
-                              beta, depth+1, action_backtrack)
+                backtrack_dict[a] = -np.inf
+            undo = make_move(state, a)
+            if i == 0 or not pvs:
+                v2, _ = min_value(state, alpha,
+                                  beta, depth+1, action_backtrack)
+            else:
+                # Is the move any better than alpha?
+                v2, _ = min_value(state, alpha, np.nextafter(alpha, np.inf), depth+1, action_backtrack)
+                if alpha < v2 < beta:
+                    v2, _ = min_value(state, alpha,
+                                      beta, depth+1, action_backtrack)
+            unmake_move(state, undo)
+            if depth == 0:
+                backtrack_dict[a] = v2
             if v2 > v:
                 v, move = v2, a
                 alpha = max(alpha, v)
-                backtrack_dict[action_backtrack] = v
             if v >= beta:
-                return v, move
+                orderer.cutoff(a, depth, horizon - depth, bool(undo[2]))
+                break
+            if depth == 0 and shared_alpha is not None:
+                with shared_alpha.get_lock():
+                    if alpha > shared_alpha.value:
+                        shared_alpha.value = alpha
+                    else:
+                        alpha = shared_alpha.value
+        orderer.searched(i, v >= beta)
+        # A root bounded by the other workers has no meaningful bound type
+        if depth > 0 or shared_alpha is None:
+            store(state, alpha0, beta0, depth, v, move)
         return v, move
 
-    @cache
     def min_value(state, alpha, beta, depth, action_backtrack):
-        nonlocal backtrack_dict
+        nonlocal backtrack_dict, nodes
+        nodes += 1
         if game.terminal_test(state, player):
-            return game.utility(state, player), None
+            return evaluate(state, player), None
         if cutoff(game, state, depth):
-            return game.compute_utility(
-                state, player), None
-        if time.time() - start_time > time_limit:
-            best_action = max(backtrack_dict, key=backtrack_dict.get)
-            print("TIMEOUT: ", best_action)
-            raise TimeoutError(best_action)
+            if quiescence:
+                return quiesce(state, alpha, beta), None
+            return evaluate(state, player), None
+        check_time()
+        alpha0, beta0 = alpha, beta
+        value, tt_move, alpha, beta = probe(state, alpha, beta, depth)
+        if value is not None:
+            return value, tt_move
+        if batch and depth > 0 and horizon - depth == 1:
+            return frontier(state, alpha0, beta0, depth, maximize=False)
         v, move = +np.inf, None
-        if isinstance(state, Tablut):
-            pieces = copy.deepcopy(state.initial.pieces)
-            board = state.initial.board  # red2...
-        elif isinstance(state, Board):
-            pieces = copy.deepcopy(state.pieces)
-            board = state.board
-        for a in game.actions(pieces, player, board):
-            v2, _ = max_value(game.result(state, a),
-                              alpha, beta, depth+1, action_backtrack)
+        moves = orderer.order(state, legal_moves(state), tt_move, depth)
+        i = -1
+        for i, a in enumerate(moves):
+            undo = make_move(state, a)
+            if i == 0 or not pvs:
+                v2, _ = max_value(state,
+                                  alpha, beta, depth+1, action_backtrack)
+            else:
+                # Is the move any better than beta?
+                v2, _ = max_value(state, np.nextafter(beta, -np.inf), beta, depth+1, action_backtrack)
+                if alpha < v2 < beta:
+                    v2, _ = max_value(state,
+                                      alpha, beta, depth+1, action_backtrack)
+            unmake_move(state, undo)
             if v2 < v:
                 v, move = v2, a
                 beta = min(beta, v)
             if v <= alpha:
-                return v, move
+                orderer.cutoff(a, depth, horizon - depth, bool(undo[2]))
+                break
+        orderer.searched(i, v <= alpha)
+        store(state, alpha0, beta0, depth, v, move)
         return v, move
 
-    start_time = time.time()
     try:
-        result = max_value(state, -np.inf, +np.inf, 0)[-1]
+        value, move = max_value(board, window[0], window[1], 0)
+    finally:
+        # The nodes of an interrupted search count as well
+        if search_stats is not None:
+            search_stats.nodes += nodes
+    return value, move, backtrack_dict, nodes
+
+
+def principal_variation(board, tt, max_length=64):
+    """
+    Returns the best line of play from board, following the moves of the
+    transposition table until an entry is missing or the line repeats.
+    """
+    board = board.copy()
+    line, seen = [], set()
+    while len(line) < max_length and board.hash not in seen:
+        seen.add(board.hash)
+        entry = tt.probe(board.hash)
+        if entry is None or entry[3] not in board.legal_moves():
+            break
+        line.append(entry[3])
+        board.make_move(entry[3])
+    return line
+
+
+def h_alphabeta_search(state, game, cutoff, time_limit=55, tt=None):
+    """
+    Performs a heuristic alpha-beta search to find the best move for a given game state.
+
+    Args:
+        state: The current game state.
+        game: The game object representing the rules of the game.
+        cutoff: The cutoff function that determines when to stop the search.
+        time_limit: The maximum time limit for the search.
+        tt: The TranspositionTable to probe and fill. It can be kept across
+            the turns of a game, as long as the searching player stays the same.
+
+    Returns:
+        The best move to be played from the current state.
+    """
+    # The search moves on its own copy of the board with make/unmake
+    if isinstance(state, Tablut):
+        state = state.initial
+    board = state.copy()
+
+    if tt is None:
+        tt = TranspositionTable()
+    tt.new_search()
+
+    try:
+        result = alphabeta(board, game, cutoff, time.time() + time_limit, tt)[1]
     except TimeoutError as e:
         result = e.args[0]
     except WinException as e:
@@ -157,17 +489,165 @@ def h_alphabeta_search(state, game, cutoff, time_limit=55):
     return result
 
 
-def play_game(name: str, team: str, server_ip: str, timeout: int):
+def iterative_deepening_search(state, game, time_limit=55, tt=None, max_depth=64, move_cache=None, stop=None,
+                               search_stats=None, aspiration=ASPIRATION_WINDOW, quiescence=QUIESCENCE_NODES):
+    """
+    Searches 1, 2, 3... plies deep until the time runs out and returns the
+    best move of the last completed iteration.
+
+    From the second iteration on, the root is searched with an aspiration
+    window: aspiration on either side of the value of the previous iteration.
+    A value outside of it is only a bound, so the side it fell out of is
+    widened fourfold and the iteration searched again (the last retry with
+    an open bound).
+
+    The root moves of each iteration are ordered by the scores of the
+    previous one. Before starting a new depth, its duration is predicted from
+    the last iteration time and the measured branching factor (ratio of the
+    node counts of the last two iterations): if it would not fit in the
+    remaining time the search stops there instead of being cut halfway.
+
+    Args:
+        state: The current game state.
+        game: The game object representing the rules of the game.
+        time_limit: The maximum time limit for the search.
+        tt: The TranspositionTable shared by the iterations.
+        max_depth: The deepest iteration to run.
+        move_cache: An LRUCache of the legal moves, shared by the iterations.
+        stop: A threading.Event that ends the search like the time limit when set.
+        search_stats: A SearchStats the iterations are recorded in.
+        aspiration: The half width of the aspiration window, None searches
+            every iteration with the full window.
+        quiescence: The node budget of the quiescence search of a leaf, 0
+            evaluates the leaves as they are.
+
+    Returns:
+        The best move to be played from the current state.
+    """
+    start_time = time.time()
+    deadline = start_time + time_limit
+
+    if isinstance(state, Tablut):
+        state = state.initial
+    board = state.copy()
+
+    if tt is None:
+        tt = TranspositionTable()
+    tt.new_search()
+
+    # The killers and the history scores are shared by the iterations
+    orderer = MoveOrderer()
+
+    best_move, root_moves = None, None
+    last_nodes = last_value = None
+    for depth in range(1, max_depth + 1):
+        iteration_start = time.time()
+        orderer.reset_stats()
+        delta = aspiration
+        if aspiration and last_value is not None:
+            alpha, beta = last_value - delta, last_value + delta
+        else:
+            alpha, beta = -np.inf, np.inf
+        nodes, researches = 0, 0
+        try:
+            while True:
+                value, move, scores, searched = alphabeta(
+                    board, game, cutoff_depth(depth - 1), deadline, tt, root_moves, orderer=orderer,
+                    move_cache=move_cache, stop=stop, search_stats=search_stats, window=(alpha, beta),
+                    quiescence=quiescence)
+                nodes += searched
+                if alpha < value < beta or (value <= alpha and alpha == -np.inf) \
+                        or (value >= beta and beta == np.inf):
+                    break
+                # Failed low or high: widen that side of the window
+                researches += 1
+                delta = delta * 4 if researches < 3 else np.inf
+                if value <= alpha:
+                    alpha = value - delta
+                else:
+                    beta = value + delta
+        except TimeoutError as e:
+            # The first iteration always gives an answer, even if partial
+            if best_move is None:
+                best_move = e.args[0]
+            break
+        except WinException as e:
+            return e.args[0]
+
+        iteration_time = time.time() - iteration_start
+        best_move, last_value = move, value
+        root_moves = sorted(scores, key=scores.get, reverse=True)
+        stats = orderer.stats()
+        pv = principal_variation(board, tt, depth)
+        if search_stats is not None:
+            search_stats.iteration(depth, nodes, iteration_time, value, stats, pv, researches)
+        print(f"DEPTH {depth}: {move} {value:.3f} ({nodes} nodes, {iteration_time:.2f}s, "
+              f"{stats['first_move_cutoff_rate']:.0%} first-move cutoffs, "
+              f"{stats['moves_per_node']:.1f} moves/node, {researches} re-searches)")
+        print("PV:", " ".join(f"{a}-{b}" for a, b in map(game.convert_move, pv)))
+
+        # A won or lost position will not change with depth
+        if abs(value) >= 1e10:
+            break
+
+        branching = nodes / last_nodes if last_nodes else len(root_moves)
+        last_nodes = nodes
+        remaining = deadline - time.time()
+        if iteration_time * max(branching, 1) > remaining:
+            break
+
+    if best_move is None:
+        best_move = next(iter(board.legal_moves()), None)
+    return best_move
+
+
+def play_game(name: str, team: str, server_ip: str, timeout: int, tt_size: float = 64, workers: int = 1, port: int = None,
+              cache_size: float = 0, eval_cache_size: float = 0, book_path: str = 'book.bin',
+              endgame_time: float = 2, ponder: bool = True, stats_path: str = None):
     # Clear the screen
     # os.system('cls' if os.name == 'nt' else 'clear')
 
     # Initialize game
     game = Tablut()
 
+    # The transposition table is kept for the whole game, within tt_size MB
+    tt = TranspositionTable(max_mb=tt_size)
+
+    # The legal moves are memoized for the whole game, within cache_size MB
+    # (0 disables it)
+    move_cache = None
+    if cache_size:
+        move_cache = LRUCache(max_bytes=cache_size * 2**20)
+
+    # So are the evaluations of the positions, within eval_cache_size MB
+    if eval_cache_size:
+        game.eval_cache = EvalCache(max_mb=eval_cache_size)
+
+    # The opening book is memory-mapped, if it has been built
+    book = None
+    if book_path and os.path.exists(book_path):
+        book = OpeningBook(book_path)
+        print(f"OPENING BOOK: {len(book)} positions")
+
+    # The king-escape races are solved exactly, within endgame_time seconds (0 disables it)
+    solver = EndgameSolver(time_limit=endgame_time) if endgame_time else None
+
+    # The worker processes are started once for the whole game
+    searcher = ParallelSearcher(
+        workers, tt_size=tt_size) if workers > 1 else None
+
+    # The opponent's time is spent searching the position after its expected
+    # reply (not with the worker processes, which have their own tables)
+    ponderer = Ponderer(game, tt, move_cache) if ponder and searcher is None else None
+
+    # The statistics of every move are appended to stats_path as JSON lines
+    # (None disables them)
+    search_stats = SearchStats(stats_path) if stats_path else None
+
     cond = threading.Condition()
 
     # Initialize network
-    network = Network(name, team, server_ip, timeout=timeout)
+    network = Network(name, team, server_ip, timeout=timeout, port=port)
 
     # Get initial state and turn
     pieces, turn = network.connect()
@@ -176,42 +656,95 @@ def play_game(name: str, team: str, server_ip: str, timeout: int):
 
     # Play game
     state = game.initial
-    while True:
-        with cond:
-            while not network.check_turn(player=team):
-                cond.wait(timeout=1)
-                pieces, turn = network.get_state()
+    # Number of moves sent by this player
+    turns = 0
+    try:
+        while True:
+            with cond:
+                while not network.check_turn(player=team):
+                    if ponderer is not None:
+                        ponderer.start(state)
+                    try:
+                        pieces, turn = network.get_state()
+                    finally:
+                        if ponderer is not None:
+                            ponderer.stop()
+                    if type(pieces) != int:
+                        game.update_state(pieces, turn)
+                        if ponderer is not None:
+                            hit = ponderer.record(state)
+                            print("PONDER HIT" if hit else "PONDER MISS", ponderer.stats())
+                    else:
+                        return pieces, turns
+
+                # The book probe and the endgame solver take from the time of the move
+                turn_start = time.time()
+
+                if game.eval_cache is not None:
+                    game.eval_cache.new_move()
+                if search_stats is not None:
+                    search_stats.new_move(tt, move_cache, game.eval_cache)
+
+                # A book move is checked, a hash collision must not play an illegal move
+                move = book.probe(state.hash) if book is not None else None
+                if move is not None and move not in state.legal_moves():
+                    move = None
+                source = 'search'
+                if move is not None:
+                    source = 'book'
+                    print("BOOK MOVE:", move)
+
+                # A forced win or loss is played without searching
+                if move is None and solver is not None and solver.applicable(state):
+                    solution = solver.solve(state)
+                    if solution is not None:
+                        outcome, move, plies = solution
+                        source = 'endgame'
+                        print(f"ENDGAME: {outcome} in {plies} plies, {move}")
+                    print("ENDGAME SOLVER:", solver.stats())
+
+                # Get move (5 seconds of tolerance for sending the move)
+                time_limit = max(timeout - 5 - (time.time() - turn_start), 0)
+                if move is None and searcher is not None:
+                    move = searcher.search(state, time_limit=time_limit)
+                elif move is None:
+                    move = iterative_deepening_search(
+                        state, game, time_limit=time_limit, tt=tt, move_cache=move_cache,
+                        search_stats=search_stats)
+                if move_cache is not None:
+                    print("MOVE CACHE:", move_cache.stats())
+                if game.eval_cache is not None:
+                    stats = game.eval_cache.stats()
+                    print(f"EVAL CACHE: {stats['hit_rate']:.1%} hits, "
+                          f"{stats['time_saved']:.2f}s saved")
+                if search_stats is not None:
+                    search_stats.write(move, player=team, source=source)
+
+                # Send move to server
+                converted_move = game.convert_move(move)
+                network.send_move(converted_move)
+                turns += 1
+                try:
+                    pieces, turn = network.get_state()
+                except:
+                    return 3, turns
                 if type(pieces) != int:
+                    # Update the game state for the current player
                     game.update_state(pieces, turn)
                 else:
                     return pieces, turns
 
-            # Get move
-            move = h_alphabeta_search(
-                state, game, cutoff_depth(2), time_limit=timeout-5)  # 5 seconds of tolerance for sending the move
-
-            # Send move to server
-            converted_move = game.convert_move(move)
-            network.send_move(converted_move)
-            try:
-                pieces, turn = network.get_state()
-            except:
-                return 3, turns
-            if type(pieces) != int:
                 # Update the game state for the current player
                 game.update_state(pieces, turn)
-            else:
-                return pieces, turns
-
-            # Update the game state for the current player
-            game.update_state(pieces, turn)
 
-            # Update state
-            state = copy.copy(game)
-            state = state.initial
+                # Update state
+                state = game.initial
 
-            # Notify the other thread
-            cond.notify_all()
+                # Notify the other thread
+                cond.notify_all()
+    finally:
+        if searcher is not None:
+            searcher.shutdown()
 
 
 if __name__ == "__main__":
@@ -223,9 +756,29 @@ if __name__ == "__main__":
         "--name", help="The name of the player", type=str, default='\tLut')
     argparse.add_argument(
         "--ip", help="The IP address of the server", type=str, default="localhost")
+    argparse.add_argument(
+        "--port", help="The port of the server (default 5800 for WHITE, 5801 for BLACK)", type=int, default=None)
     argparse.add_argument(
         "--timeout", help="The timeout for the server", type=int, default=60)
+    argparse.add_argument(
+        "--tt-size", help="The memory cap of the transposition table in MB", type=float, default=64)
+    argparse.add_argument(
+        "--cache-size", help="The memory cap in MB of the move cache (0 disables it)", type=float, default=0)
+    argparse.add_argument(
+        "--eval-cache-size", help="The memory cap in MB of the evaluation cache (0 disables it)", type=float, default=0)
+    argparse.add_argument(
+        "--workers", help="The number of search processes (1 searches in the main process)", type=int, default=1)
+    argparse.add_argument(
+        "--book", help="The opening book built by book.py (ignored if missing)", type=str, default="book.bin")
+    argparse.add_argument(
+        "--endgame-time", help="The seconds the endgame solver can take on each move (0 disables it)", type=float, default=2)
+    argparse.add_argument(
+        "--no-ponder", help="Do not search while the opponent is thinking", action="store_true")
+    argparse.add_argument(
+        "--stats-file", help="The file the search statistics of every move are appended to as JSON lines", type=str, default=None)
     args = argparse.parse_args()
 
     result, turns = play_game(
-        name=args.name, team=args.team, server_ip=args.ip, timeout=args.timeout)
+        name=args.name, team=args.team, server_ip=args.ip, timeout=args.timeout, tt_size=args.tt_size, workers=args.workers, port=args.port,
+        cache_size=args.cache_size, eval_cache_size=args.eval_cache_size, book_path=args.book,
+        endgame_time=args.endgame_time, ponder=not args.no_ponder, stats_path=args.stats_file)
@@ -0,0 +1,122 @@
+"""
+Pondering: searching on the opponent's time.
+
+Once its move is sent, the player would sit idle until the opponent answers.
+Ponderer uses that time: it predicts the reply of the opponent (the move the
+transposition table holds for the position, else the move leading to the
+best position for the opponent), plays it on a copy of the board and searches the resulting
+position in a background thread, with the transposition table of the game.
+
+When the real position arrives the search is stopped at once. If the
+opponent played the predicted move, the table already holds the first
+iterations of the search of the position to move from, so the real search
+gets through them in no time and goes deeper within the same timeout. If it
+did not, the work is thrown away, but the entries stay in the table.
+
+The searches run in a thread, so they share the interpreter with the main
+thread: that one is blocked on the socket in the meantime, which releases
+the GIL.
+"""
+import threading
+
+# numpy
+import numpy as np
+
+# Tablut Class
+from tablut import Tablut
+
+
+class Ponderer:
+    def __init__(self, game, tt, move_cache=None, max_time=3600):
+        """
+        Args:
+            game (Tablut): The game the searches are made for.
+            tt (TranspositionTable): The transposition table of the game.
+            move_cache (LRUCache): The move cache of the game, if any.
+            max_time (float): The seconds after which a ponder search gives
+                up by itself, in case it is never stopped.
+        """
+        self.game = game
+        self.tt = tt
+        self.move_cache = move_cache
+        self.max_time = max_time
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.prediction = None
+        self.hits = self.misses = 0
+
+    def predict(self, board):
+        """
+        Returns the expected move of the player to move on board.
+        """
+        moves = board.legal_moves()
+        entry = self.tt.probe(board.hash)
+        if entry is not None and entry[3] in moves:
+            return entry[3]
+        if not moves:
+            return None
+        # The children are only scored: a search would store in the table
+        # values seen from the side of the opponent
+        moves = list(moves)
+        scores = self.game.child_utilities(board, moves, board.to_move)
+        return moves[int(np.argmax(scores))]
+
+    def start(self, state):
+        """
+        Starts pondering on state, where the opponent is to move.
+        """
+        if isinstance(state, Tablut):
+            state = state.initial
+        self.stop_event.clear()
+        self.prediction = None
+        self.thread = threading.Thread(
+            target=self._ponder, args=(state.copy(),), daemon=True)
+        self.thread.start()
+
+    def _ponder(self, board):
+        # play imports this module
+        from play import iterative_deepening_search
+
+        reply = self.predict(board)
+        if reply is None or self.stop_event.is_set():
+            return
+        board.make_move(reply)
+        self.prediction = (reply, board.hash)
+        print("PONDERING ON:", reply)
+        iterative_deepening_search(board, self.game, time_limit=self.max_time, tt=self.tt,
+                                   move_cache=self.move_cache, stop=self.stop_event)
+
+    def stop(self):
+        """
+        Stops pondering, as soon as the opponent has moved.
+        """
+        if self.thread is None:
+            return
+        self.stop_event.set()
+        self.thread.join()
+        self.thread = None
+
+    def record(self, state):
+        """
+        Counts the prediction as right or wrong now that the real position state is known.
+
+        Returns:
+            bool: Whether the opponent played the predicted move.
+        """
+        if isinstance(state, Tablut):
+            state = state.initial
+        hit = self.prediction is not None and self.prediction[1] == state.hash
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.prediction = None
+        return hit
+
+    def stats(self):
+        """
+        Returns the number of right and wrong predictions and the hit rate.
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.0}
@@ -0,0 +1,161 @@
+"""
+Move generators of the quiescence search.
+
+When the search reaches its depth in the middle of a capture exchange, or
+with the king one move away from an escape square, the static evaluation
+misjudges the position. alphabeta then keeps searching the noisy moves only:
+
+- the captures, generated backwards from the squares where a capture can
+  happen (next to an enemy piece with a hostile square on its other side,
+  or next to the king for BLACK) to the pieces that can slide there;
+- for WHITE, the king moves onto an escape square or onto a square from
+  which one can be reached (escape threats);
+- for BLACK, when the king already has an open line to an escape square,
+  the moves that block it or capture the king (the evasions): any other
+  move loses.
+"""
+# move generation
+from bitboard import (NUM_SQUARES, SQUARES, SQUARE_BB, THRONE_BB, CAMPS_BB, ESCAPES_BB,
+                      NEIGHBOURS_BB, RAY_SQUARES, BETWEEN, NORTH, WEST, ESCAPE_RAYS_BB,
+                      square, iter_squares, first_blocker, pawn_moves, open_escapes)
+
+# utils
+from utils import Pawn
+
+# CAPTURE_PAIRS[sq]: the bitboards of the squares on the two sides of sq,
+# along the column and along the row
+CAPTURE_PAIRS = tuple(
+    tuple((SQUARE_BB[RAY_SQUARES[d][sq][0]], SQUARE_BB[RAY_SQUARES[d ^ 1][sq][0]])
+          for d in (NORTH, WEST) if RAY_SQUARES[d][sq] and RAY_SQUARES[d ^ 1][sq])
+    for sq in range(NUM_SQUARES)
+)
+
+
+def moves_to(targets, own, occupied):
+    """
+    Returns the moves of the pieces in own that land on one of the targets.
+
+    Args:
+        targets (int): Bitboard of empty squares.
+        own (int): Bitboard of the pieces that can move.
+        occupied (int): Bitboard of every piece, the throne included.
+    """
+    moves = []
+    for target in iter_squares(targets):
+        for direction in range(4):
+            origin = first_blocker(target, direction, occupied)
+            if origin is None or not SQUARE_BB[origin] & own:
+                continue
+            # Only the pawns still inside a camp can cross or enter one
+            if not SQUARE_BB[origin] & CAMPS_BB and \
+                    (BETWEEN[origin][target] | SQUARE_BB[target]) & CAMPS_BB:
+                continue
+            moves.append((SQUARES[origin], SQUARES[target]))
+    return moves
+
+
+def capture_moves(board):
+    """
+    Returns the moves of the player to move that capture at least one piece.
+    """
+    white, black, king = board.white_bb, board.black_bb, board.king_bb
+    occupied = white | black | king | THRONE_BB
+    empty_throne = THRONE_BB & ~king
+    if board.to_move == 'WHITE':
+        own = friends = white | king
+        enemies = black
+    else:
+        own = friends = black
+        enemies = white
+
+    # The empty squares on one side of an enemy pawn with a hostile square
+    # on the other side
+    targets = 0
+    hostile = friends | empty_throne
+    for sq in iter_squares(enemies):
+        around = hostile if SQUARE_BB[sq] & CAMPS_BB else hostile | CAMPS_BB
+        for before, after in CAPTURE_PAIRS[sq]:
+            if after & around:
+                targets |= before
+            if before & around:
+                targets |= after
+    targets &= ~occupied
+    # Any move there captures: the piece cannot come from the other side,
+    # so that side is as hostile after the move as before
+    moves = moves_to(targets, own, occupied)
+
+    if board.to_move == 'BLACK' and king:
+        # The king takes more than two pawns next to the throne
+        around_king = NEIGHBOURS_BB[square(*board.king)] & ~occupied & ~targets
+        moves += [move for move in moves_to(around_king, own, occupied) if board.captures(move)]
+    return moves
+
+
+def escape_lines(board):
+    """
+    Returns the bitboard of the squares the king crosses to reach an escape
+    square in one move (0 when it cannot).
+    """
+    if board.king is None:
+        return 0
+    return open_escapes(square(*board.king), board.occupied)
+
+
+def line_openers(board):
+    """
+    Returns the bitboard of the pieces that alone block a line of the king
+    to an escape square, and the bitboard of those lines: moving one of
+    them off its line lets the king escape on the next move.
+    """
+    if board.king is None:
+        return 0, 0
+    blockers = board.occupied | CAMPS_BB
+    openers = lines = 0
+    for line in ESCAPE_RAYS_BB[square(*board.king)]:
+        blocked = line & blockers
+        if blocked and not blocked & (blocked - 1) and not blocked & CAMPS_BB:
+            openers |= blocked
+            lines |= line
+    return openers, lines
+
+
+def escape_threats(board):
+    """
+    Returns the king moves onto an escape square or onto a square with an
+    open line to one.
+    """
+    if board.king is None:
+        return []
+    sq = square(*board.king)
+    # The king leaves its square
+    occupied = board.occupied & ~SQUARE_BB[sq]
+    threats = []
+    for move in pawn_moves(sq, board.occupied | CAMPS_BB):
+        to_sq = square(*move[1])
+        if SQUARE_BB[to_sq] & ESCAPES_BB or open_escapes(to_sq, occupied):
+            threats.append(move)
+    return threats
+
+
+def evasions(board, lines):
+    """
+    Returns the moves of BLACK that block the open escape lines of the king
+    or capture it.
+    """
+    occupied = board.occupied
+    around_king = NEIGHBOURS_BB[square(*board.king)] & ~occupied
+    captures = [move for move in moves_to(around_king, board.black_bb, occupied)
+                if any(value == Pawn.KING.value for _, value in board.captures(move))]
+    blocks = moves_to(lines, board.black_bb, occupied)
+    return captures + [move for move in blocks if move not in captures]
+
+
+def noisy_moves(board):
+    """
+    Returns the captures of the player to move, and the escape threats of
+    the king for WHITE.
+    """
+    moves = capture_moves(board)
+    if board.to_move == 'WHITE':
+        moves += [move for move in escape_threats(board) if move not in moves]
+    return moves
@@ -0,0 +1,130 @@
+"""
+Instrumentation of the search.
+
+SearchStats collects what the searches of one move did: the nodes visited
+and the leaves evaluated, the transposition table and cache hits, the beta
+cutoffs, the depth reached with the nodes of every iteration (and so the
+branching factor), and the time spent generating the moves (actions),
+playing them (result) and evaluating the leaves. At the end of the move the
+counters are appended to a file as one JSON line, so that the logs of
+different builds or tournaments can be compared line by line.
+
+The collector is off by default: without one, alphabeta does not time or
+count anything beyond its own node counter.
+"""
+import json
+import time
+from time import perf_counter
+
+TIMERS = ('actions', 'result', 'evaluation')
+
+
+class SearchStats:
+    def __init__(self, path):
+        """
+        Args:
+            path (str): The JSON lines file the records are appended to.
+        """
+        self.path = path
+        self.moves = 0
+        self.tt = self.move_cache = self.eval_cache = None
+        self.new_move()
+
+    def new_move(self, tt=None, move_cache=None, eval_cache=None):
+        """
+        Resets the counters before the search of a move, taking note of the
+        counters of the tables the search uses.
+
+        Args:
+            tt (TranspositionTable): The transposition table of the search.
+            move_cache (LRUCache): The move cache, if any.
+            eval_cache (EvalCache): The evaluation cache, if any.
+        """
+        self.start = time.time()
+        self.nodes = self.leaves = 0
+        self.iterations = []
+        self.times = dict.fromkeys(TIMERS, 0.0)
+        self.tt, self.move_cache, self.eval_cache = tt, move_cache, eval_cache
+        self._snapshot = {name: (table.hits, table.misses)
+                          for name, table in self._tables() if table is not None}
+
+    def _tables(self):
+        return (('tt', self.tt), ('move_cache', self.move_cache), ('eval_cache', self.eval_cache))
+
+    def timed(self, name, func, leaves=None):
+        """
+        Wraps func so that the time of its calls adds up under name.
+
+        Args:
+            name (str): One of TIMERS.
+            func (callable): The function to time.
+            leaves (callable): If given, returns from the arguments of a call
+                the number of positions it evaluates.
+        """
+        def wrapper(*args):
+            start = perf_counter()
+            result = func(*args)
+            self.times[name] += perf_counter() - start
+            if leaves is not None:
+                self.leaves += leaves(*args)
+            return result
+        return wrapper
+
+    def iteration(self, depth, nodes, elapsed, value, ordering, pv=(), researches=0):
+        """
+        Records a completed iteration of iterative deepening.
+
+        Args:
+            depth (int): The depth of the iteration.
+            nodes (int): The nodes it searched.
+            elapsed (float): The seconds it took.
+            value (float): The value of the root.
+            ordering (dict): MoveOrderer.stats() of the iteration.
+            pv (list): The principal variation found.
+            researches (int): The searches repeated after an aspiration failure.
+        """
+        self.iterations.append({'depth': depth, 'nodes': nodes, 'time': elapsed, 'value': value,
+                                'cutoffs': ordering['cutoffs'],
+                                'first_move_cutoff_rate': ordering['first_move_cutoff_rate'],
+                                'pv': list(pv), 'researches': researches})
+
+    def record(self, move, **fields):
+        """
+        Returns the counters of the move as a dict.
+
+        Args:
+            move: The move played.
+            fields: Anything else to put in the record.
+        """
+        elapsed = time.time() - self.start
+        nodes = [it['nodes'] for it in self.iterations]
+        if len(nodes) > 1 and nodes[-2]:
+            branching = nodes[-1] / nodes[-2]
+        elif nodes:
+            branching = float(nodes[-1])
+        else:
+            branching = None
+
+        record = {'move': self.moves, 'played': move, 'elapsed': elapsed,
+                  'nodes': self.nodes, 'nps': self.nodes / elapsed if elapsed else 0.0,
+                  'leaves': self.leaves,
+                  'depth': self.iterations[-1]['depth'] if self.iterations else 0,
+                  'branching_factor': branching,
+                  'beta_cutoffs': sum(it['cutoffs'] for it in self.iterations),
+                  'times': self.times, 'iterations': self.iterations}
+        for name, table in self._tables():
+            if table is not None:
+                hits, misses = self._snapshot[name]
+                record[name] = {'hits': table.hits - hits, 'misses': table.misses - misses}
+        record.update(fields)
+        return record
+
+    def write(self, move, **fields):
+        """
+        Appends the record of the move to the file and returns it.
+        """
+        self.moves += 1
+        record = self.record(move, **fields)
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+        return record
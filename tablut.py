@@ -1,8 +1,5 @@
-import copy
 import random
-
-# numpy
-import numpy as np
+import time
 
 # AIMA
 from aima.games import Game
@@ -10,28 +7,45 @@ from aima.games import Game
 # Board class
 from board import Board
 
+# move generation
+import bitboard
+
 # utils
 from utils import Pawn
 
 # heuristics
-from whiteheuristics import white_fitness  # white_fitness_dynamic
-from blackheuristics import black_fitness  # black_fitness_dynamic
+from whiteheuristics import WHITE_WEIGHTS  # white_fitness_dynamic
+from blackheuristics import BLACK_WEIGHTS  # black_fitness_dynamic
+from features import feature_weights, child_features, dot
+
+# quiescence search
+from quiescence import capture_moves
 
 
 class Tablut(Game):
-    def __init__(self, height: int = 9, width: int = 9):
+    def __init__(self, height: int = 9, width: int = 9, white_weights=WHITE_WEIGHTS, black_weights=BLACK_WEIGHTS):
         """
         Initializes a Tablut game object.
 
         Parameters:
         - height (int): The height of the game board. Default is 9.
         - width (int): The width of the game board. Default is 9.
+        - white_weights (tuple): The weights of white_fitness. Default is WHITE_WEIGHTS.
+        - black_weights (tuple): The weights of black_fitness. Default is BLACK_WEIGHTS.
         """
         self.initial = Board(height=height, width=width,
                              to_move='WHITE', utility=0)
 
         self.width = width
         self.height = height
+        self.white_weights = tuple(white_weights)
+        self.black_weights = tuple(black_weights)
+        # The same weights as coefficients of the features maintained by the boards
+        self.feature_weights = {'WHITE': feature_weights('WHITE', self.white_weights),
+                                'BLACK': feature_weights('BLACK', self.black_weights)}
+
+        # An optional EvalCache of compute_utility
+        self.eval_cache = None
 
     def update_state(self, pieces, turn):
         """
@@ -45,30 +59,10 @@ class Tablut(Game):
             None
         """
         # Update board state
-        self.initial.pieces = pieces
         self.initial.to_move = turn
+        self.initial.load(pieces)
         self.to_move = turn
 
-        # Update pawns coordinates
-        white_pos = self.initial.get_white()
-        black_pos = self.initial.get_black()
-        king_pos = self.initial.get_king()
-
-        # Shuffle the list of possible moves
-        # random.shuffle(white_pos)
-        # random.shuffle(black_pos)
-
-        # White has also the king
-        white_pos.insert(0, king_pos)
-
-        # Get the current player and compute the list of possible moves
-        if turn == 'WHITE':
-            self.squares = [[x, (k, l)] for x in white_pos for k in range(
-                self.width) for l in range(self.height)]
-        elif turn == 'BLACK':
-            self.squares = [[x, (k, l)] for x in black_pos for k in range(
-                self.width) for l in range(self.height)]
-
     def move(self, move):
         """
         Moves a pawn on the board according to the given move.
@@ -86,39 +80,25 @@ class Tablut(Game):
 
         pawn_type = self.initial.pieces[x1][y1]
 
-        new_board = copy.deepcopy(self.initial.pieces)
-
         # Get the pawn type
         if pawn_type == Pawn.EMPTY.value or pawn_type == Pawn.THRONE.value:
-            self.initial.pieces = new_board
             return self
 
         if self.initial.pieces[x2][y2] != Pawn.EMPTY.value:
-            self.initial.pieces = new_board
             return self
 
-        if x1 == 4 and y1 == 4:
-            new_board[x1][y1] = Pawn.THRONE.value
-        else:
-            new_board[x1][y1] = Pawn.EMPTY.value
-
-        # Remove the pawn from the starting position and add it to the ending position
-        new_board[x2][y2] = pawn_type
-
-        # Check if there are any captures (important otherwise heuristics won't work)
-        self.initial.check_attacks(x2, y2)
-
-        self.initial.pieces = new_board
-
-        # Change turn
-        self.initial.to_move = (
-            "BLACK" if self.initial.to_move == "WHITE" else "WHITE")
+        # Move the pawn, resolve the captures and change turn in place
+        self.initial.make_move(move)
         return self
 
     def actions(self, pieces, player, board) -> set:
         """
         Returns a set of allowed moves for the current player.
 
+        Moves are generated on bitboards: the rays leaving every pawn are
+        precomputed and cut at the first occupied square, the throne or, for
+        the pawns outside of them, the camps.
+
         Args:
             pieces (numpy.ndarray): The current state of the game board.
             player (str): The current player ('WHITE' or 'BLACK').
@@ -127,147 +107,15 @@ class Tablut(Game):
         Returns:
             set: A set of allowed moves for the current player.
         """
-        pawns = np.where(pieces == Pawn.WHITE.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
-        white = coordinates
-
-        pawns = np.where(pieces == Pawn.BLACK.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
-        black = coordinates
-
-        pawns = np.where(pieces == Pawn.KING.value)
-        coordinates = list(zip(pawns[0], pawns[1]))
-        king = coordinates[0]
+        white, black, king = bitboard.from_pieces(pieces)
 
-        white.insert(0, king)
-
-        throne = [(4, 4)]
-
-        # print("White pieces:", white)
-
-        # Get the list of the opponent pieces
+        # White has also the king
         if player == 'WHITE':
-            player_pieces = white
-            opponent_pieces = black
-
+            own = white | king
         elif player == 'BLACK':
-            player_pieces = black
-            opponent_pieces = white
-
-        # Occupied squares as the set of tuples of white, black and king pieces
-        occupied_squares = player_pieces + opponent_pieces + throne
-
-        # Get the list of the occupied squares in coordinates (x, y)
-        occupied_squares = set(map(tuple, occupied_squares))
-        # throne is always an occupied square (even if it is empty) | you can't go through it
-
-        # Initialize forbidden moves set
-        forbidden_moves = set()
-
-        # Starting position (tuple) and ending position (tuple)
-        for move in self.squares:
-            from_pos = move[0]
-            from_row, from_col = from_pos
-
-            to_pos = move[1]
-            to_row, to_col = to_pos
-
-            for occ_place in occupied_squares:
-                forbidden_moves.add(
-                    (from_pos, occ_place))  # occupied squares
-
-            forbidden_moves.add((from_pos, from_pos))  # starting position
-
-            # Can't move enemy's pawn
-            if from_pos in opponent_pieces:
-                forbidden_moves.add((from_pos, to_pos))
-
-            # remove diagonal moves
-            if from_row != to_row and from_col != to_col:
-                forbidden_moves.add((from_pos, to_pos))
-
-            # remove moves which implies jumping over a piece
-            # The idea is to check in a "circular" way the perimeter around the piece
-            # So it only needs one for-loop.
-            # If flags are not set, the move is legal. If the flag is set (= i'm on a piece or over it)
-            # Add the move to the forbiddens one
-
-            flags = [
-                False,
-                False,
-                False,
-                False
-            ]
-
-            # If i move from outside a barrack inside a barrack, that move is invalid. But i can move freely move inside barracks
-            from utils import RED, RED2
-            for i in range(1, self.width):
-                if from_col - i >= 0:
-                    if (flags[0] or (from_row, from_col - i) in occupied_squares) or \
-                            (board[from_row][from_col] not in (RED, RED2) and board[from_row][from_col - i] in (RED, RED2)):
-
-                        flags[0] = True
-                        forbidden_moves.add(
-                            (from_pos, (from_row, from_col - i)))
-
-                if from_row - i >= 0:
-                    if flags[1] or (from_row - i, from_col) in occupied_squares or \
-                            (board[from_row][from_col] not in (RED, RED2) and board[from_row - i][from_col] in (RED, RED2)):
-
-                        flags[1] = True
-                        forbidden_moves.add(
-                            (from_pos, (from_row - i, from_col)))
-
-                if from_col + i < self.width:
-                    if flags[2] or (from_row, from_col+i) in occupied_squares or \
-                            (board[from_row][from_col] not in (RED, RED2) and board[from_row][from_col + i] in (RED, RED2)):
-
-                        flags[2] = True
-                        forbidden_moves.add(
-                            (from_pos, (from_row, from_col+i)))
-
-                if from_row + i < self.width:
-                    if flags[3] or (from_row + i, from_col) in occupied_squares or \
-                            (board[from_row][from_col] not in (RED, RED2) and board[from_row + i][from_col] in (RED, RED2)):
-
-                        flags[3] = True
-                        forbidden_moves.add(
-                            (from_pos, (from_row + i, from_col)))
-
-            # Barrack's check
-            barracks = (
-                (
-                    (0, 3),
-                    (0, 4),
-                    (0, 5),
-                    (1, 4)
-                ),
-                (
-                    (3, 0),
-                    (4, 0),
-                    (5, 0),
-                    (4, 1)
-                ),
-                (
-                    (self.width-1, 3),
-                    (self.width-1, 4),
-                    (self.width-1, 5),
-                    (self.width-2, 4)
-                ),
-                (
-                    (3, self.width-1),
-                    (4, self.width-1),
-                    (5, self.width-1),
-                    (4, self.width-2),
-                )
-            )
-
-        # return difference between all possible moves and forbidden moves (list of tuples)
-        total_moves = set(tuple(tuple(k) for k in h)
-                          for h in self.squares)
-
-        allowed_moves = total_moves - forbidden_moves
-        return allowed_moves
+            own = black
+
+        return bitboard.legal_moves(own, white | black | king)
 
     def result(self, state, move, flag: bool = False):
         """
@@ -282,33 +130,20 @@ class Tablut(Game):
         Returns:
         The resulting state after applying the move.
         """
-        # Apply the move locally and check for captures
-        game = Tablut()
-
+        # Apply the move on a copy of the board and check for captures
         if isinstance(state, Tablut):
-            game.initial.pieces = copy.deepcopy(state.initial.pieces)
+            board = state.initial.copy()
         elif isinstance(state, Board):
-            game.initial.pieces = copy.deepcopy(state.pieces)
-
-        game.initial.get_white()
-        game.initial.get_black()
-        game.initial.get_king()
+            board = state.copy()
 
         if flag is False:
-            game = game.move(move)
-
-        game.update_state(game.initial.pieces, game.initial.to_move)
-
-        # Compute the utility of the board
+            board.make_move(move)
 
         # Update the utility of the board
-        game.initial.utility = self.compute_utility(
-            game.initial, player=game.initial.to_move)
-
-        print("UTILITY: ", game.initial.utility)
+        board.utility = self.compute_utility(board, player=board.to_move)
 
         # return the new board
-        return game.initial
+        return board
 
     def utility(self, board, player):
         """Return the value to player; 1 for win, -1 for loss, 0 otherwise.
@@ -332,20 +167,57 @@ class Tablut(Game):
         Returns:
         - True if the game is in a terminal state (winning move or no more moves), False otherwise.
         """
-        return self.check_win(board, player)
+        return self.check_win(board, 'WHITE') or self.check_win(board, 'BLACK')
 
     def compute_utility(self, board, player) -> float:
+        if self.eval_cache is None:
+            return self._compute_utility(board, player)
+
+        key = self.eval_cache.key(board.hash, player)
+        fitness = self.eval_cache.probe(key)
+        if fitness is None:
+            start = time.perf_counter()
+            fitness = self._compute_utility(board, player)
+            self.eval_cache.store(key, fitness, time.perf_counter() - start)
+        return fitness
 
+    def _compute_utility(self, board, player) -> float:
+
+        # Both fitness functions grow with the advantage of player
         if self.check_win(board, player):
-            return +1e10 if player == 'WHITE' else -1e10
+            return +1e10
+        elif self.check_win(board, 'BLACK' if player == 'WHITE' else 'WHITE'):
+            return -1e10
         else:
-            if player == 'WHITE':
-                fitness = white_fitness(board)
+            # white_fitness or black_fitness, from the features of the board
+            return dot(board.features, self.feature_weights[player])
 
-            elif player == 'BLACK':
-                fitness = black_fitness(board)
+    def child_utilities(self, board, moves, player, captures=None) -> list:
+        """
+        compute_utility of the position every move leads to from board.
 
-            return fitness
+        The moves that capture nothing are not played: the features of their
+        positions are derived from the ones board maintains. The others, given
+        in captures (the ones of quiescence.capture_moves if None), are played
+        and taken back; a king reaching an escape square wins.
+        """
+        weights = self.feature_weights[player]
+        features = board.features
+        escaped = +1e10 if player == 'WHITE' else -1e10
+        king = board.king
+        if captures is None:
+            captures = set(capture_moves(board))
+        scores = []
+        for move in moves:
+            if move in captures:
+                undo = board.make_move(move)
+                scores.append(self.compute_utility(board, player))
+                board.unmake_move(undo)
+            elif move[0] == king and move[1] in bitboard.ESCAPES:
+                scores.append(escaped)
+            else:
+                scores.append(dot(child_features(features, board, move), weights))
+        return scores
 
     def check_win(self, state, player):
         """
@@ -356,17 +228,19 @@ class Tablut(Game):
         - The same "state" of the game is reached twice: draw
         """
 
-        if isinstance(state, Board):
-            white_pieces = state.get_white()
-            black_pieces = state.get_black()
-            king_pieces = state.get_king()
+        # The piece lists are kept up to date by Board.make_move
+        if isinstance(state, Tablut):
+            state = state.initial
 
-        elif isinstance(state, Tablut):
-            white_pieces = state.initial.get_white()
-            black_pieces = state.initial.get_black()
-            king_pieces = state.initial.get_king()
+        white_pieces = state.whites
+        black_pieces = state.blacks
+        king_pieces = state.king
 
         if player == 'WHITE':
+            # King escaped
+            if state.king_bb & bitboard.ESCAPES_BB:
+                return True
+
             if len(black_pieces) == 0:
                 return True
 
@@ -412,7 +286,7 @@ class Tablut(Game):
         Otherwise, self.black_moves_to_eat_king is set to [[-1,-1], [-1,-1]]
         '''
 
-        if self.initial.get_king() == (4, 4):
+        if self.initial.get_king() == bitboard.THRONE:
             self.black_moves_to_eat_king = self.eat_king_in_castle()
         else:
             self.black_moves_to_eat_king = self.eat_king_outside_castle()
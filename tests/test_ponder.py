@@ -0,0 +1,33 @@
+import numpy as np
+
+# Tablut Class
+from tablut import Tablut
+
+# transposition table
+from transposition import TranspositionTable
+
+# pondering
+from ponder import Ponderer
+
+# utils
+from utils import initial_pieces
+
+TABLE_ARRAYS = ('keys', 'values', 'depths', 'flags', 'ages', 'moves')
+
+
+def test_predict_leaves_the_table_unchanged():
+    game = Tablut()
+    game.update_state(initial_pieces(), 'WHITE')
+    board = game.initial.copy()
+    board.make_move(((4, 2), (7, 2)))
+
+    tt = TranspositionTable(max_mb=1)
+    assert tt.probe(board.hash) is None
+    before = {name: getattr(tt, name).copy() for name in TABLE_ARRAYS}
+
+    move = Ponderer(game, tt).predict(board)
+
+    assert move in board.legal_moves()
+    for name in TABLE_ARRAYS:
+        assert np.array_equal(getattr(tt, name), before[name]), name
+    assert tt.age == 0 and tt.stores == 0
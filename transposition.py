@@ -0,0 +1,125 @@
+"""
+Fixed-size transposition table for the alpha-beta search.
+
+The table lives in preallocated NumPy arrays sized from a memory cap, so it
+can be kept for a whole game without growing. Slots are paired in buckets:
+the first slot of a bucket keeps the deepest result (depth-preferred), the
+second one always takes the newest result that did not fit in the first.
+"""
+import numpy as np
+
+# move generation
+from bitboard import SQUARES, square
+
+# Bound types of the stored values
+EXACT, LOWER, UPPER = 1, 2, 3
+
+NO_MOVE = -1
+
+# keys + values + depth, flag, age + move
+ENTRY_BYTES = 8 + 8 + 1 + 1 + 1 + 2
+
+
+def encode_move(move):
+    """Packs a ((x1, y1), (x2, y2)) move in a single int."""
+    (from_pos, to_pos) = move
+    return square(*from_pos) * 81 + square(*to_pos)
+
+
+def decode_move(code):
+    """Inverse of encode_move, returns None for NO_MOVE."""
+    if code == NO_MOVE:
+        return None
+    return SQUARES[code // 81], SQUARES[code % 81]
+
+
+class TranspositionTable:
+    def __init__(self, max_mb=64):
+        """
+        Allocates the table.
+
+        Args:
+            max_mb (float): The memory cap of the table in megabytes.
+        """
+        # Power of two buckets so that the index is a mask of the hash
+        buckets = max(1, int(max_mb * 2**20) // (2 * ENTRY_BYTES))
+        buckets = 1 << (buckets.bit_length() - 1)
+        self.mask = buckets - 1
+        self.size = 2 * buckets
+
+        self.keys = np.zeros(self.size, dtype=np.uint64)
+        self.values = np.zeros(self.size, dtype=np.float64)
+        self.depths = np.full(self.size, -1, dtype=np.int8)
+        self.flags = np.zeros(self.size, dtype=np.int8)
+        self.ages = np.zeros(self.size, dtype=np.uint8)
+        self.moves = np.full(self.size, NO_MOVE, dtype=np.int16)
+
+        self.age = 0
+        self.hits = self.misses = self.stores = 0
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.keys, self.values, self.depths, self.flags, self.ages, self.moves))
+
+    def new_search(self):
+        """
+        Marks the start of a new search: the entries of the previous ones
+        are kept, but they lose their depth priority on replacement.
+        """
+        self.age = (self.age + 1) % 256
+
+    def clear(self):
+        self.keys[:] = 0
+        self.depths[:] = -1
+        self.moves[:] = NO_MOVE
+
+    def _slot(self, key):
+        slot = (key & self.mask) * 2
+        if self.depths[slot] >= 0 and int(self.keys[slot]) == key:
+            return slot
+        if self.depths[slot + 1] >= 0 and int(self.keys[slot + 1]) == key:
+            return slot + 1
+        return None
+
+    def probe(self, key):
+        """
+        Looks up a position.
+
+        Args:
+            key (int): The Zobrist hash of the position.
+
+        Returns:
+            tuple: (depth, flag, value, move) of the stored entry, or None.
+        """
+        slot = self._slot(key)
+        if slot is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return (int(self.depths[slot]), int(self.flags[slot]),
+                float(self.values[slot]), decode_move(int(self.moves[slot])))
+
+    def store(self, key, depth, flag, value, move):
+        """
+        Stores the result of searching a position.
+
+        Args:
+            key (int): The Zobrist hash of the position.
+            depth (int): The remaining depth the position has been searched to.
+            flag (int): EXACT, LOWER or UPPER.
+            value (float): The value found by the search.
+            move (tuple): The best move found, or None.
+        """
+        slot = (key & self.mask) * 2
+        # The depth-preferred slot is taken by the same position, by a
+        # shallower search or by an entry left over from a previous search
+        if int(self.keys[slot]) != key and self.depths[slot] > depth and self.ages[slot] == self.age:
+            slot += 1
+
+        self.keys[slot] = key
+        self.values[slot] = value
+        self.depths[slot] = depth
+        self.flags[slot] = flag
+        self.ages[slot] = self.age
+        self.moves[slot] = NO_MOVE if move is None else encode_move(move)
+        self.stores += 1
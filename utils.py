@@ -3,6 +3,7 @@ import socket
 import sys
 import struct
 from enum import Enum
+from itertools import chain
 
 import numpy as np
 
@@ -28,10 +29,28 @@ class Pawn(Enum):
     THRONE = 4
 
 
+# The Pawn value of every name the server gives to a square
+PAWN_VALUES = {pawn.name: pawn.value for pawn in Pawn}
+
+
 class WinException(Exception):
     pass
 
 
+def initial_pieces():
+    """
+    Returns the 9x9 matrix of Pawn values of the standard (Ashton) starting position.
+    """
+    pieces = np.zeros((9, 9), dtype=int)
+    for x, y in [(0, 3), (0, 4), (0, 5), (1, 4), (3, 0), (4, 0), (5, 0), (4, 1),
+                 (3, 8), (4, 8), (5, 8), (4, 7), (8, 3), (8, 4), (8, 5), (7, 4)]:
+        pieces[x][y] = Pawn.BLACK.value
+    for x, y in [(2, 4), (3, 4), (5, 4), (6, 4), (4, 2), (4, 3), (4, 5), (4, 6)]:
+        pieces[x][y] = Pawn.WHITE.value
+    pieces[4][4] = Pawn.KING.value
+    return pieces
+
+
 class Converter:
     def json_to_matrix(self, json_state):
         data = list(json_state.items())
@@ -43,14 +62,15 @@ class Converter:
         if isinstance(turn, tuple):
             turn = turn[1]
 
-        board = np.vectorize(lambda x: Pawn[x].value)(board)
-        board = board.reshape(9, 9)
+        # One dict lookup per square, written straight into the array
+        board = np.fromiter(map(PAWN_VALUES.__getitem__, chain.from_iterable(board)),
+                            dtype=np.int8, count=81).reshape(9, 9)
 
         return board, turn
 
 
 class Network:
-    def __init__(self, name, player, server_ip='localhost', converter=None, sock=None, timeout=60):
+    def __init__(self, name, player, server_ip='localhost', converter=None, sock=None, timeout=60, port=None):
         if not sock:
             self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         else:
@@ -65,24 +85,29 @@ class Network:
         self.name = name
         self.player = player
         self.timeout = timeout
+        # The port of the server, by default 5800 for WHITE and 5801 for BLACK
+        self.port = port
 
     def recvall(self, n):
-        # Helper function to recv n bytes or return None if EOF is hit
-        data = b''
-        while len(data) < n:
-            packet = self.sock.recv(n - len(data))
-            if not packet:
+        # Helper function to recv n bytes or return None if EOF is hit.
+        # The bytes are received in place, without concatenating the packets
+        data = bytearray(n)
+        view = memoryview(data)
+        received = 0
+        while received < n:
+            size = self.sock.recv_into(view[received:])
+            if not size:
                 return None
-            data += packet
+            received += size
         return data
 
     def connect(self):
         if self.player == 'WHITE':
             # Connect the socket to the port where the server is listening
-            server_address = (self.server_ip, 5800)
+            server_address = (self.server_ip, self.port or 5800)
         elif self.player == 'BLACK':
             # Connect the socket to the port where the server is listening
-            server_address = (self.server_ip, 5801)
+            server_address = (self.server_ip, self.port or 5801)
         else:
             raise ConnectionError("Player must be WHITE or BLACK!")
 
@@ -90,14 +115,27 @@ class Network:
         self.sock.connect(server_address)
 
         # Send the player's name to the server
-        self.sock.send(struct.pack('>i', len(self.name)))
-        self.sock.send(self.name.encode())
+        self.send_message(self.name.encode())
 
         return self.get_state()
 
+    def send_message(self, data):
+        # Length and payload in a single write, a message is never split
+        # into two packets
+        self.sock.sendall(struct.pack('>i', len(data)) + data)
+
+    def recv_message(self):
+        header = self.recvall(4)
+        if header is None:
+            raise ConnectionError("The server closed the connection")
+        # A single recv may return only part of a long payload
+        data = self.recvall(struct.unpack('>i', header)[0])
+        if data is None:
+            raise ConnectionError("The server closed the connection")
+        return data
+
     def get_state(self):
-        len_bytes = struct.unpack('>i', self.recvall(4))[0]
-        current_state_server_bytes = self.sock.recv(len_bytes)
+        current_state_server_bytes = self.recv_message()
 
         # Converting byte into json
         json_current_state_server = json.loads(current_state_server_bytes)
@@ -130,8 +168,7 @@ class Network:
 
         move = json.dumps({"from": _from, "to": _to, "turn": turn})
 
-        self.sock.send(struct.pack('>i', len(move)))
-        self.sock.send(move.encode())
+        self.send_message(move.encode())
         return move
 
     def check_turn(self, player):
@@ -0,0 +1,29 @@
+"""
+Zobrist keys of the Tablut positions.
+
+Every (piece, square) pair gets a random 64-bit key and the hash of a
+position is the xor of the keys of its pieces, xored with TURN_KEY when BLACK
+is to move. Moving, capturing or passing the turn only xors a couple of keys
+in or out, so Board keeps its hash up to date in make_move/unmake_move.
+"""
+import random
+
+# move generation
+from bitboard import NUM_SQUARES
+
+# utils
+from utils import Pawn
+
+# Fixed seed: the keys (and so the hashes) are the same in every process
+_rng = random.Random(0x7AB1)
+
+# PIECE_KEYS[pawn value][square]
+PIECE_KEYS = {
+    value: tuple(_rng.getrandbits(64) for _ in range(NUM_SQUARES))
+    for value in (Pawn.WHITE.value, Pawn.BLACK.value, Pawn.KING.value)
+}
+
+TURN_KEY = _rng.getrandbits(64)
+
+# Xored into a hash to tell the evaluations made for BLACK from those for WHITE
+PLAYER_KEY = _rng.getrandbits(64)